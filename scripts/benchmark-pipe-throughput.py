@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Measures the throughput of data flowing through the pipeline depending on the pipe buffer size
+# and compares the in-kernel fd forwarding (splice/sendfile) with the copy through user space.
+#
+# Usage: ./benchmark-pipe-throughput.py [--size-mb 512] [--pipe-sizes 65536,1048576]
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from pyshrimp import ExecutionPipeline, PIPE_END
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.utils import _forward_fd
+
+
+def _measure_pipeline(size_mb, pipe_buffer_size):
+    started_at = time.perf_counter()
+    res = (
+        ExecutionPipeline(binary=True, pipe_buffer_size=pipe_buffer_size)
+        | ['head', '-c', f'{size_mb}M', '/dev/zero']
+        | ['cat']
+        | ['cat']
+        | ['wc', '-c']
+        | PIPE_END
+    )
+    elapsed = time.perf_counter() - started_at
+    assert int(res.stdout) == size_mb * 1024 * 1024
+    return size_mb / elapsed
+
+
+def _copy_through_user_space(src_fd, dst_fd, chunk_size=1024 * 1024):
+    for chunk in iter(lambda: os.read(src_fd, chunk_size), b''):
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dst_fd, view):]
+
+
+def _measure_forwarding(size_mb, forward):
+    pipe_r, pipe_w = os.pipe()
+
+    def _produce():
+        with open('/dev/zero', 'rb') as src:
+            remaining = size_mb * 1024 * 1024
+            while remaining:
+                remaining -= os.write(pipe_w, src.read(min(remaining, 1024 * 1024)))
+
+        os.close(pipe_w)
+
+    with tempfile.TemporaryFile() as dst:
+        producer = threading.Thread(target=_produce)
+        started_at = time.perf_counter()
+        producer.start()
+        forward(pipe_r, dst.fileno())
+        producer.join()
+        elapsed = time.perf_counter() - started_at
+
+    os.close(pipe_r)
+    return size_mb / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=512, help='amount of data pushed through the pipeline')
+    parser.add_argument('--pipe-sizes', default='65536,262144,1048576', help='comma separated list of pipe buffer sizes')
+    args = parser.parse_args()
+
+    print(f'{"pipe buffer [B]":>16} {"pipeline [MB/s]":>16}')
+    print(f'{"default":>16} {_measure_pipeline(args.size_mb, None):>16.1f}')
+    for pipe_size in (int(el) for el in args.pipe_sizes.split(',')):
+        print(f'{pipe_size:>16} {_measure_pipeline(args.size_mb, pipe_size):>16.1f}')
+
+    print()
+    print(f'{"pipe -> file":>16} {"copy [MB/s]":>16} {"splice [MB/s]":>16}')
+    copy = _measure_forwarding(args.size_mb, _copy_through_user_space)
+    splice = _measure_forwarding(args.size_mb, _forward_fd)
+    print(f'{"":>16} {copy:>16.1f} {splice:>16.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# Measures the latency of spawning short-lived process depending on the parent process memory size.
+#
+# Usage: ./benchmark-spawn-latency.py [--rss-mb 0,512,2048] [--runs 200]
+import argparse
+import os
+import time
+
+from pyshrimp import run_process
+
+
+def _rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+
+
+def _grow_rss(ballast, target_mb):
+    chunk_mb = 64
+    while _rss_mb() < target_mb:
+        # touch the memory so the pages are really mapped
+        ballast.append(bytearray(b'x' * (chunk_mb * 1024 * 1024)))
+
+
+def _measure(runs, fast_spawn):
+    started_at = time.perf_counter()
+    for _ in range(runs):
+        run_process(['true'], capture_out=True, capture_err=True, fast_spawn=fast_spawn).raise_if_not_ok()
+
+    return (time.perf_counter() - started_at) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rss-mb', default='0,512,2048', help='comma separated list of parent RSS sizes to test')
+    parser.add_argument('--runs', type=int, default=200, help='number of spawns per measurement')
+    args = parser.parse_args()
+
+    ballast = []
+    print(f'{"parent RSS [MB]":>16} {"default [ms]":>12} {"fast_spawn [ms]":>16}')
+    for target_mb in sorted(int(el) for el in args.rss_mb.split(',')):
+        _grow_rss(ballast, target_mb)
+        default_ms = _measure(args.runs, fast_spawn=False)
+        fast_ms = _measure(args.runs, fast_spawn=True)
+        print(f'{_rss_mb():>16} {default_ms:>12.3f} {fast_ms:>16.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,15 @@ __version__ = '0.8.0.dev1'
 from pyshrimp._internal.wrapper.mainwrapper import _run as run
 # noinspection PyProtectedMember
 from pyshrimp._internal.wrapper.mainwrapper import _init_logging as init_logging
-from pyshrimp.execution_pipeline.pipeline import pipe, ExecutionPipeline
+from pyshrimp.execution_pipeline.pipeline import pipe, pipe_async, ExecutionPipeline, PipelineOutputStream
 from pyshrimp.execution_pipeline.pipeline_api import PipelineExecutionResult
-from pyshrimp.execution_pipeline.pipeline_starter import PIPE, PIPE_END, PIPE_END_STDOUT
+from pyshrimp.execution_pipeline.pipeline_starter import PIPE, PIPE_END, PIPE_END_STDOUT, PIPE_ITER, PIPE_TO_FILE
+from pyshrimp.execution_pipeline.codecs import PipelineCodec, JsonLinesCodec, TsvCodec
+from pyshrimp.execution_pipeline.stages import parallel_stage, head, take_while, tee, merge
+from pyshrimp.execution_pipeline.template import PipelineTemplate
 from pyshrimp.utils.command import cmd, shell_cmd, Command, SkipConfig, CommandArgProcessor, DefaultCommandArgProcessor
+from pyshrimp.utils.command_cache import CommandResultCache
+from pyshrimp.utils.shell_session import shell_session, ShellSession
 from pyshrimp.utils.dotdict import as_dot_dict, unwrap_dot_dict
 from pyshrimp.utils.filesystem import ls, glob_ls, chmod_set, chmod_unset, read_file, read_file_bin, write_to_file
 from pyshrimp.utils.splitter import regex_splitter, create_regex_splitter
@@ -17,6 +22,9 @@ from pyshrimp.utils.logging import log, exit_error
 from pyshrimp.utils.matching import re_match_all
 from pyshrimp.utils.parallel import in_background
 from pyshrimp.utils.string_wrapper import StringWrapper
-from pyshrimp.utils.subprocess_utils import run_process, ProcessExecutionException, ProcessExecutionResult
+from pyshrimp.utils.bytes_wrapper import BytesWrapper
+from pyshrimp.utils.output_capture import CapturePolicy, SpilledOutput
+from pyshrimp.utils.resource_usage import ProcessResourceUsage, ResourceUsageCollector, add_execution_listener, remove_execution_listener
+from pyshrimp.utils.subprocess_utils import run_process, run_process_async, stream_process, BatchedProcessExecutionResult, ProcessExecutionException, ProcessBatchExecutionException, ProcessExecutionResult, ProcessOutputStream
 from pyshrimp.utils.wait import wait_until, wait_until_gen
 from pyshrimp.utils.collections import first_not_null
\ No newline at end of file
@@ -1,42 +1,62 @@
 import io
 import os
 from threading import Thread
-from typing import Callable
+from typing import Callable, Optional
 
-from pyshrimp._internal.pipes.utils import _collect_stream_to_string
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.channel import _open_queue_channel, _QueueChannelWriter
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.iterator_function import _IteratorReader
 from pyshrimp.execution_pipeline.pipeline_api import PipelineElement, PipelineExecutionResult
 
 
+class _CollectedTextOutput(io.StringIO):
+
+    def close(self):
+        # the value is needed after the function completes
+        pass
+
+
+class _CollectedBinaryOutput(io.BytesIO):
+
+    def close(self):
+        pass
+
+
 class _AsyncFunctionPipelineElement(PipelineElement):
+    """
+    Runs function writing to `stream_output` in background thread.
+
+    The output channel is chosen by the consumer: the next python stage reads the written chunks directly
+    from in-process channel, the pipe is created only when the output is consumed by the process.
+    When the output is not consumed at all it is collected in memory. The function is started once the channel is known.
+    """
 
-    def __init__(self, function: Callable, left_out):
+    def __init__(self, function: Callable, left_out, binary=False):
         super().__init__()
 
-        self._left_out = left_out
+        self._left_out = self._open_input(left_out, binary)
         self._function = function
+        self._binary = binary
         self._result = None
         self._stdout_collected = None
         self._exception = None
+        self._right_out_writer = None
+        self._right_out = None
+        self._thread = None
 
-        # create output pipe for function
-        pipe_r, pipe_w = os.pipe()
-
-        self._open_write_pipe = io.open(pipe_w, 'wb')
-
-        # TODO: add support for binary streams
-        self._right_out_writer = io.TextIOWrapper(
-            self._open_write_pipe,
-            write_through=True,
-            line_buffering=False,
-            encoding='UTF-8'
-        )
+    @staticmethod
+    def _open_input(left_out, binary):
+        if not isinstance(left_out, int):
+            return left_out
 
-        open_read_pipe = io.open(pipe_r, 'rb')
-        self._right_out = io.TextIOWrapper(
-            open_read_pipe,
-            encoding='UTF-8'
-        )
+        # raw file descriptor (e.g. pipe with text fed by the pipeline)
+        stream = io.open(left_out, 'rb')
+        return stream if binary else io.TextIOWrapper(stream, encoding='UTF-8')
 
+    def _start(self, writer, right_out=None):
+        self._right_out_writer = writer
+        self._right_out = right_out
         self._thread = Thread(target=self._thread_main)
         self._thread.start()
 
@@ -49,15 +69,74 @@ class _AsyncFunctionPipelineElement(PipelineElement):
         except Exception as ex:
             self._exception = ex
         finally:
-            self._right_out_writer.close()
+            if isinstance(self._left_out, _IteratorReader):
+                # release in-process upstream which may wait for the consumer
+                self._left_out.close()
+
+            if self._right_out is not None:
+                try:
+                    self._right_out_writer.close()
+                except BrokenPipeError:
+                    # the consumer has stopped reading - the unflushed data is not needed
+                    pass
 
     def _close_once(self):
+        if self._thread is None:
+            # nobody consumes the output - collect it in memory
+            self._start(_CollectedBinaryOutput() if self._binary else _CollectedTextOutput())
+            self._thread.join()
+            self._stdout_collected = self._right_out_writer.getvalue()
+            return
+
+        # the output was consumed by the next stage - release our end so the function is not blocked on it
+        self._right_out.close()
         self._thread.join()
-        self._stdout_collected = _collect_stream_to_string(self._right_out)
         # TODO: ?? if should_raise and self._exception: raise AsyncFunctionInvocationException(self._exception)
 
     def stdout_for_pipe(self):
-        return self._right_out
+        pipe_r, pipe_w = os.pipe()
+
+        if self._binary:
+            writer = io.open(pipe_w, 'wb', buffering=0)
+            reader = io.open(pipe_r, 'rb')
+
+        else:
+            writer = io.TextIOWrapper(
+                io.open(pipe_w, 'wb'),
+                write_through=True,
+                line_buffering=False,
+                encoding='UTF-8'
+            )
+
+            reader = io.TextIOWrapper(
+                io.open(pipe_r, 'rb'),
+                encoding='UTF-8'
+            )
+
+        self._start(writer, reader)
+        return reader
+
+    def on_stdout_passed_to_process(self):
+        self._right_out.close()
+
+    def cancel(self):
+        # the thread cannot be interrupted - the function gets BrokenPipeError on the next write to the channel
+        if isinstance(self._right_out_writer, _QueueChannelWriter):
+            self._right_out_writer.reader_closed = True
+
+    def result_after_cancel(self, timeout: float) -> Optional[PipelineExecutionResult]:
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return None
+
+        return self.result
+
+    def stdout_for_python(self):
+        # the writes are passed in blocks - few blocks in flight are enough to keep both threads busy
+        writer, reader = _open_queue_channel(binary=self._binary, max_chunks=16)
+        self._start(writer, reader)
+        return reader
 
     @property
     def result(self) -> PipelineExecutionResult:
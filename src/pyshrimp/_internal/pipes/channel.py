@@ -0,0 +1,228 @@
+import io
+from collections import deque
+from itertools import chain
+from queue import Queue, Full, Empty
+from threading import Lock
+from typing import List, Tuple
+
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.iterator_function import _LineIterator
+
+_END_OF_DATA = object()
+# the longest time the written data waits in the buffer while the reader is idle
+_HANDOVER_SEC = 0.005
+
+
+class _QueueChannelWriter(io.IOBase):
+    """
+    Writing end of in-process channel - the written data is passed to the reader without encoding.
+    The writes are buffered and passed in blocks of `buffer_size` - handing over each write to other thread
+    would be slower than the pipe. The idle reader takes the buffer after few milliseconds and the first write after
+    the reader ran out of data is handed over right away, so the data of slow writer is not delayed.
+    The queue is bounded so the fast writer is throttled by the reader, writing after the reader was closed
+    raises `BrokenPipeError` (as writing to the pipe would). The writer must be used by single thread.
+    """
+
+    def __init__(self, queue: Queue, buffer_size: int = 64 * 1024):
+        super().__init__()
+        self._queue = queue
+        self._buffer_size = buffer_size
+        # appended without locking (deque is thread-safe) - the lock only orders taking of the buffer
+        self._buffer = deque()
+        self._buffered = 0
+        self._take_lock = Lock()
+        self._reader_waiting = False
+        self.reader_closed = False
+
+    def writable(self):
+        return True
+
+    def _put(self, item):
+        while True:
+            if self.reader_closed:
+                raise BrokenPipeError('Channel reader was closed')
+
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def _take_buffer(self):
+        parts = []
+        try:
+            while True:
+                parts.append(self._buffer.popleft())
+        except IndexError:
+            pass
+
+        return parts[0][:0].join(parts) if parts else None
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('Write to closed channel')
+
+        if data:
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._reader_waiting or self._buffered >= self._buffer_size:
+                self.flush()
+
+        return len(data)
+
+    def flush(self):
+        with self._take_lock:
+            self._buffered = 0
+            self._reader_waiting = False
+            block = self._take_buffer()
+
+        # the lock is not held while waiting for the room in the queue - the reader may need it to take the buffer
+        # (there is single writer, so nothing is written until the block is put)
+        if block is not None:
+            self._put(block)
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            self.flush()
+            self._put(_END_OF_DATA)
+        except BrokenPipeError:
+            # the channel may be cancelled while the reader still waits for the data - wake it up
+            try:
+                self._queue.put_nowait(_END_OF_DATA)
+            except Full:
+                pass
+        finally:
+            super().close()
+
+    def _steal_buffer(self):
+        # called by the reader which ran out of data
+        with self._take_lock:
+            # the flag is set before checking the buffer - the concurrent write either is in the buffer
+            # or sees the flag and flushes
+            self._reader_waiting = True
+            block = self._take_buffer()
+            if block is not None:
+                self._reader_waiting = False
+
+            return block
+
+    def _next_for_reader(self):
+        # called by the reader - the queued blocks go first, the buffer is taken when nothing was queued for a while
+        try:
+            return self._queue.get(timeout=_HANDOVER_SEC)
+        except Empty:
+            pass
+
+        block = self._steal_buffer()
+        return block if block is not None else self._queue.get()
+
+
+class _QueueBatchWriter(_QueueChannelWriter):
+    """
+    Channel writer passing the written items (lines or objects) in lists of up to `buffer_size` items - the items
+    are not joined, so they are received as they were written. Multiple writers (threads) may share the queue.
+    """
+
+    def write(self, item):
+        if self.closed:
+            raise ValueError('Write to closed channel')
+
+        self._buffer.append(item)
+        self._buffered += 1
+        if self._reader_waiting or self._buffered >= self._buffer_size:
+            self.flush()
+
+    def _take_buffer(self):
+        if not self._buffer:
+            return None
+
+        batch = []
+        try:
+            while True:
+                batch.append(self._buffer.popleft())
+        except IndexError:
+            pass
+
+        return batch
+
+
+def _iter_channel_blocks(writer: _QueueChannelWriter, empty):
+    # yields the line iterators over the received blocks - the lines are split in C (no python code per line)
+    new_line = empty + (b'\n' if isinstance(empty, bytes) else '\n')
+    pending = empty
+
+    while True:
+        chunk = writer._next_for_reader()
+        if chunk is _END_OF_DATA:
+            break
+
+        end_of_lines = chunk.rfind(new_line) + 1
+        if not end_of_lines:
+            pending += chunk
+            continue
+
+        block = pending + chunk[:end_of_lines] if pending else chunk[:end_of_lines]
+        pending = chunk[end_of_lines:]
+        yield io.BytesIO(block) if isinstance(block, bytes) else io.StringIO(block, newline='\n')
+
+    if pending:
+        yield iter((pending,))
+
+
+def _iter_channel_lines(writer: _QueueChannelWriter, empty):
+    return chain.from_iterable(_iter_channel_blocks(writer, empty))
+
+
+def _iter_channel_batches(queue: Queue, writers: List[_QueueBatchWriter]):
+    remaining = len(writers)
+    while remaining:
+        try:
+            batches = (queue.get(timeout=_HANDOVER_SEC),)
+        except Empty:
+            batches = [batch for batch in (writer._steal_buffer() for writer in writers) if batch is not None]
+            if not batches:
+                batches = (queue.get(),)
+
+        for batch in batches:
+            if batch is _END_OF_DATA:
+                remaining -= 1
+            else:
+                yield batch
+
+
+def _closing_reader(queue: Queue, writers):
+    def _close_reader():
+        for writer in writers:
+            writer.reader_closed = True
+
+        # release the writers blocked on the full queue
+        try:
+            while True:
+                queue.get_nowait()
+        except Empty:
+            pass
+
+    return _close_reader
+
+
+def _open_queue_channel(binary=False, max_chunks=1024) -> Tuple[_QueueChannelWriter, _LineIterator]:
+    """
+    Opens in-process replacement of the pipe. Returns the writer (file-like) and the reader iterating over lines.
+    """
+    queue = Queue(maxsize=max_chunks)
+    writer = _QueueChannelWriter(queue)
+    return writer, _LineIterator(_iter_channel_lines(writer, b'' if binary else ''), on_close=_closing_reader(queue, [writer]))
+
+
+def _open_queue_batch_channel(writers=1, batch_size=64, max_batches=16) -> Tuple[List[_QueueBatchWriter], _LineIterator]:
+    """
+    Opens in-process channel passing the items in batches. Returns the writers (one per producing thread)
+    and the reader iterating over the items - the reader ends once all the writers were closed.
+    """
+    queue = Queue(maxsize=max_batches)
+    batch_writers = [_QueueBatchWriter(queue, buffer_size=batch_size) for _ in range(writers)]
+    items = chain.from_iterable(_iter_channel_batches(queue, batch_writers))
+    return batch_writers, _LineIterator(items, on_close=_closing_reader(queue, batch_writers))
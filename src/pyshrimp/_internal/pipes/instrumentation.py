@@ -0,0 +1,102 @@
+import os
+import time
+from threading import Thread
+from typing import Optional, Callable
+
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.iterator_function import _LineIterator
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.utils import _fileno_of, _write_all
+
+
+class _ConnectionStats:
+    """
+    Measurements of the data flowing between two pipeline stages.
+
+    The `consumer_wait_sec` is the time the consumer waited for the data (stage starved by the producer),
+    the `producer_wait_sec` is the time the producer waited for the consumer to take the data (back pressure).
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.lines = 0
+        self.consumer_wait_sec = 0.0
+        self.producer_wait_sec = 0.0
+        self.finished_at: Optional[float] = None
+
+    def add(self, data):
+        if isinstance(data, str):
+            self.bytes += len(data.encode('utf-8'))
+            self.lines += data.count('\n')
+
+        elif isinstance(data, (bytes, bytearray)):
+            self.bytes += len(data)
+            self.lines += data.count(b'\n')
+
+        else:
+            # object mode - the objects are counted as lines
+            self.lines += 1
+
+    def finish(self):
+        if self.finished_at is None:
+            self.finished_at = time.perf_counter()
+
+
+class _MeasuredLines(_LineIterator):
+
+    def __init__(self, lines: _LineIterator, stats: _ConnectionStats):
+        super().__init__(lines)
+        self._stats = stats
+        self._returned_at = None
+
+    def __next__(self):
+        started_at = time.perf_counter()
+        if self._returned_at is not None:
+            # lazy producer is suspended until the consumer asks for more
+            self._stats.producer_wait_sec += started_at - self._returned_at
+
+        try:
+            item = next(self._iterator)
+        except StopIteration:
+            self._stats.consumer_wait_sec += time.perf_counter() - started_at
+            self._stats.finish()
+            raise
+
+        self._returned_at = time.perf_counter()
+        self._stats.consumer_wait_sec += self._returned_at - started_at
+        self._stats.add(item)
+        return item
+
+
+def _start_relay(source, stats: _ConnectionStats, on_done: Callable[[], None], chunk_size=65536) -> int:
+    """
+    Copies the data from the source stream to new pipe measuring the traffic. Returns the read end of the pipe.
+    """
+    source_fd = _fileno_of(source)
+    pipe_r, pipe_w = os.pipe()
+
+    def _relay():
+        try:
+            while True:
+                started_at = time.perf_counter()
+                chunk = os.read(source_fd, chunk_size)
+                read_at = time.perf_counter()
+                stats.consumer_wait_sec += read_at - started_at
+                if not chunk:
+                    break
+
+                stats.add(chunk)
+                _write_all(pipe_w, chunk)
+                stats.producer_wait_sec += time.perf_counter() - read_at
+
+        except BrokenPipeError:
+            # the consumer has stopped reading
+            pass
+
+        finally:
+            stats.finish()
+            os.close(pipe_w)
+            on_done()
+
+    Thread(target=_relay, daemon=True).start()
+    return pipe_r
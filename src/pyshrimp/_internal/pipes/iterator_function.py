@@ -0,0 +1,182 @@
+import io
+from typing import Callable, Iterator, Optional
+
+from pyshrimp.execution_pipeline.pipeline_api import PipelineElement, PipelineExecutionResult
+
+
+class _LineIterator:
+    """
+    Stream of pipeline data passed between in-process stages - the elements are passed as they are
+    (no pipes and no encoding involved).
+    """
+
+    def __init__(self, iterator: Iterator, on_close: Optional[Callable[[], None]] = None):
+        self._iterator = iterator
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def iter_unwrapped(self) -> Iterator:
+        """
+        Returns the underlying iterator - consumed without the overhead of this wrapper (the closing stays with it).
+        """
+        return self._iterator
+
+    def close(self):
+        if self._closed:
+            return
+
+        self._closed = True
+        close_iterator = getattr(self._iterator, 'close', None)
+        if close_iterator:
+            close_iterator()
+
+        if self._on_close:
+            self._on_close()
+
+
+def _as_line_iterator(left_out, binary=False) -> _LineIterator:
+    if left_out is None:
+        return _LineIterator(iter(()))
+
+    if isinstance(left_out, _LineIterator):
+        return left_out
+
+    if isinstance(left_out, str):
+        return _LineIterator(iter(io.StringIO(left_out, newline='')))
+
+    if isinstance(left_out, bytes):
+        return _LineIterator(iter(io.BytesIO(left_out)))
+
+    if isinstance(left_out, int):
+        # raw file descriptor
+        stream = io.open(left_out, 'rb')
+        left_out = stream if binary else io.TextIOWrapper(stream, encoding='UTF-8')
+
+    return _LineIterator(iter(left_out), on_close=getattr(left_out, 'close', None))
+
+
+class _IteratorReader(io.IOBase):
+    """
+    File-like view of `_LineIterator` - used to feed functions expecting the stream input.
+    """
+
+    def __init__(self, lines: _LineIterator, binary=False):
+        super().__init__()
+        self._lines = lines
+        self._empty = b'' if binary else ''
+        self._buffer = self._empty
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        return next(self._lines, self._empty)
+
+    def readline(self, size=-1):
+        line = self._buffer or self._next_chunk()
+        self._buffer = self._empty
+        if 0 <= size < len(line):
+            line, self._buffer = line[:size], line[size:]
+
+        return line
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        read_size = len(self._buffer)
+        self._buffer = self._empty
+
+        while size < 0 or read_size < size:
+            chunk = self._next_chunk()
+            if not chunk:
+                break
+
+            chunks.append(chunk)
+            read_size += len(chunk)
+
+        data = self._empty.join(chunks)
+        if 0 <= size < len(data):
+            data, self._buffer = data[:size], data[size:]
+
+        return data
+
+    def __iter__(self):
+        if self._buffer or self.closed:
+            return self
+
+        # plain iteration (the common case) - the lines are passed without python code per line
+        return self._lines.iter_unwrapped()
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration()
+
+        return line
+
+    def close(self):
+        self._lines.close()
+        super().close()
+
+
+class _IteratorFunctionPipelineElement(PipelineElement):
+    """
+    Runs function consuming the lines iterator and producing iterable of output chunks (e.g. generator function).
+    The function is executed lazily - the data is processed as the output is consumed by the next stage.
+    """
+
+    def __init__(self, function: Callable, left_out, binary=False, objects=False):
+        super().__init__()
+        self._function = function
+        self._binary = binary
+        self._objects = objects
+        self._input = _as_line_iterator(left_out, binary)
+        self._produce_generator = self._produce()
+        self._output = _LineIterator(self._produce_generator)
+        self._output_consumed_by_right = False
+        self._stdout_collected = None
+        self._exception = None
+
+    @property
+    def _running(self) -> bool:
+        return self._produce_generator.gi_running
+
+    def _produce(self):
+        try:
+            yield from self._function(self._input)
+        except Exception as ex:
+            self._exception = ex
+        finally:
+            # the function may stop before the whole input was consumed - release the upstream
+            self._input.close()
+
+    def stdout_for_pipe(self):
+        self._output_consumed_by_right = True
+        return self._output
+
+    def result_after_cancel(self, timeout: float) -> Optional[PipelineExecutionResult]:
+        # the function is executed by the consumer - it's running when the consumer is blocked in it
+        return None if self._running else self.result
+
+    def _close_once(self):
+        if not self._output_consumed_by_right:
+            if self._objects:
+                self._stdout_collected = list(self._output)
+            else:
+                self._stdout_collected = (b'' if self._binary else '').join(self._output)
+
+        self._output.close()
+
+    @property
+    def result(self) -> PipelineExecutionResult:
+        return PipelineExecutionResult(
+            result=None,
+            exception=self._exception,
+            stdout=self._stdout_collected,
+            stderr=None
+        )
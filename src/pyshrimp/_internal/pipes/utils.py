@@ -1,3 +1,16 @@
+import errno
+import os
+import stat
+import tempfile
+from typing import Optional, AnyStr
+
+try:
+    import fcntl
+except ImportError:
+    # not available on windows - pipe sizes are left untouched
+    fcntl = None
+
+
 def _collect_stream_to_string(stream) -> str:
     if isinstance(stream, str):
         return stream
@@ -6,3 +19,142 @@ def _collect_stream_to_string(stream) -> str:
         return stream.read()
     finally:
         stream.close()
+
+
+# F_SETPIPE_SZ is exposed by fcntl module since python 3.10 (the value is stable Linux ABI)
+_F_SETPIPE_SZ = 1031
+_F_GETPIPE_SZ = 1032
+
+
+def _fileno_of(stream) -> Optional[int]:
+    if isinstance(stream, int):
+        return stream
+
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def _set_pipe_size(stream, size: int) -> Optional[int]:
+    """
+    Resizes the kernel buffer of the pipe (Linux only). Returns the actual pipe size or None when not resized
+    (not a pipe, unsupported platform or size above the `/proc/sys/fs/pipe-max-size` limit for unprivileged user).
+    """
+    fd = _fileno_of(stream)
+    if fd is None or fcntl is None or not stat.S_ISFIFO(os.fstat(fd).st_mode):
+        return None
+
+    try:
+        return fcntl.fcntl(fd, getattr(fcntl, 'F_SETPIPE_SZ', _F_SETPIPE_SZ), size)
+    except OSError:
+        return None
+
+
+def _get_pipe_size(stream) -> Optional[int]:
+    fd = _fileno_of(stream)
+    if fd is None or fcntl is None:
+        return None
+
+    try:
+        return fcntl.fcntl(fd, getattr(fcntl, 'F_GETPIPE_SZ', _F_GETPIPE_SZ))
+    except OSError:
+        return None
+
+
+def _forward_fd(src_fd: int, dst_fd: int, chunk_size: int = 1024 * 1024) -> int:
+    """
+    Moves all the data from the source to the destination descriptor. The data is moved within the kernel when possible:
+    `splice` is used when any side is a pipe, `sendfile` for regular file source, otherwise the data is copied.
+    Returns the number of bytes moved.
+    """
+    total = 0
+
+    if hasattr(os, 'splice'):
+        try:
+            while True:
+                moved = os.splice(src_fd, dst_fd, chunk_size)
+                if not moved:
+                    return total
+
+                total += moved
+        except OSError as ex:
+            # EINVAL - none of the descriptors is a pipe (or the file system does not support splice)
+            if ex.errno != errno.EINVAL:
+                raise
+
+    if hasattr(os, 'sendfile'):
+        try:
+            while True:
+                moved = os.sendfile(dst_fd, src_fd, None, chunk_size)
+                if not moved:
+                    return total
+
+                total += moved
+        except OSError as ex:
+            # source is not mmap-able (e.g. socket or pipe)
+            if ex.errno not in (errno.EINVAL, errno.ENOSYS):
+                raise
+
+    while True:
+        chunk = os.read(src_fd, chunk_size)
+        if not chunk:
+            return total
+
+        _write_all(dst_fd, chunk)
+        total += len(chunk)
+
+
+_DATA_CHUNK_SIZE = 1024 * 1024
+
+
+def _open_data_as_fd(data: AnyStr, pipe_buffer_size: Optional[int] = None) -> int:
+    """
+    Returns readable descriptor with the data (text is encoded with UTF-8). The caller owns the descriptor.
+
+    Data fitting into the pipe buffer is written into the pipe right away (no thread is needed to feed it),
+    bigger data is stored in anonymous memory file (or temporary file when memfd is not supported).
+    """
+    pipe_r, pipe_w = os.pipe()
+    capacity = _get_pipe_size(pipe_w) or 4096
+    if pipe_buffer_size and len(data) > capacity:
+        capacity = _set_pipe_size(pipe_w, pipe_buffer_size) or capacity
+
+    # UTF-8 encoded text is never shorter than the text itself
+    if len(data) <= capacity:
+        encoded = data.encode('utf-8') if isinstance(data, str) else data
+        if len(encoded) <= capacity:
+            _write_all(pipe_w, encoded)
+            os.close(pipe_w)
+            return pipe_r
+
+    os.close(pipe_r)
+    os.close(pipe_w)
+    return _open_data_as_file_fd(data)
+
+
+def _open_data_as_file_fd(data: AnyStr) -> int:
+    if hasattr(os, 'memfd_create'):
+        fd = os.memfd_create('pyshrimp-input', os.MFD_CLOEXEC)
+    else:
+        with tempfile.TemporaryFile() as f:
+            fd = os.dup(f.fileno())
+
+    try:
+        # encode in chunks - the whole encoded copy of the text is never held in memory
+        for start in range(0, len(data), _DATA_CHUNK_SIZE):
+            chunk = data[start:start + _DATA_CHUNK_SIZE]
+            _write_all(fd, chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        return fd
+
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
@@ -10,6 +10,7 @@ import sys
 import traceback
 
 from pyshrimp._internal.scriptrunner.cli import _handle_cli_maybe
+from pyshrimp._internal.utils.cache_dir import _pyshrimp_cache_dir
 from pyshrimp._internal.utils.platformspecific import running_on_windows
 from pyshrimp.utils.locking import acquire_file_lock
 
@@ -33,7 +34,7 @@ def _default_env_config():
     _TRUE_VALUES = ['1', 'true', 'yes']
     return _EnvConfig(
         log_enabled=os.environ.get('PYSHRIMP_LOG', '0').lower() in _TRUE_VALUES,
-        cache_dir=os.path.abspath(os.environ.get('PYSHRIMP_CACHE_DIR', None) or os.path.expanduser('~/.cache/pyshrimp'))
+        cache_dir=_pyshrimp_cache_dir()
     )
 
 
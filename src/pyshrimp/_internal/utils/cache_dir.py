@@ -0,0 +1,6 @@
+import os
+
+
+def _pyshrimp_cache_dir(*sub_dirs: str) -> str:
+    base_dir = os.path.abspath(os.environ.get('PYSHRIMP_CACHE_DIR', None) or os.path.expanduser('~/.cache/pyshrimp'))
+    return os.path.join(base_dir, *sub_dirs)
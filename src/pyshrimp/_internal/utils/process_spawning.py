@@ -0,0 +1,95 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+from functools import lru_cache
+from typing import Union, Iterable, Optional, Dict
+
+
+_MAX_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+class _ResourceTrackingPopen(subprocess.Popen):
+    """
+    Popen which reaps the child using wait4 - the resource usage of the child is kept in `rusage`.
+    The `wall_time_sec` is measured from process start until it's reaped.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.rusage = None
+        self.wall_time_sec = None
+        self._started_at = time.perf_counter()
+        super().__init__(*args, **kwargs)
+
+    if hasattr(os, 'wait4'):
+        # the functions are bound as defaults - poll may be called from __del__ during interpreter shutdown
+        def _wait4(self, pid, wait_flags, _wait4=os.wait4, _now=time.perf_counter):
+            (pid, sts, rusage) = _wait4(pid, wait_flags)
+            if pid == self.pid:
+                self.rusage = rusage
+                self.wall_time_sec = _now() - self._started_at
+
+            return pid, sts
+
+        def _try_wait(self, wait_flags):
+            try:
+                return self._wait4(self.pid, wait_flags)
+            except ChildProcessError:
+                return super()._try_wait(wait_flags)
+
+        def _internal_poll(self, _deadstate=None, **kwargs):
+            # poll() reaps the child with waitpid - the resource usage would be lost
+            kwargs['_waitpid'] = self._wait4
+            return super()._internal_poll(_deadstate=_deadstate, **kwargs)
+
+    def resource_usage_fields(self) -> dict:
+        wall_time_sec = self.wall_time_sec if self.wall_time_sec is not None else time.perf_counter() - self._started_at
+        if self.rusage is None:
+            return dict(wall_time_sec=wall_time_sec)
+
+        return dict(
+            wall_time_sec=wall_time_sec,
+            user_cpu_sec=self.rusage.ru_utime,
+            system_cpu_sec=self.rusage.ru_stime,
+            max_rss_bytes=self.rusage.ru_maxrss * _MAX_RSS_UNIT,
+            voluntary_context_switches=self.rusage.ru_nvcsw,
+            involuntary_context_switches=self.rusage.ru_nivcsw
+        )
+
+
+@lru_cache(maxsize=256)
+def _resolve_executable(name: str, path: Optional[str]) -> Optional[str]:
+    if os.path.dirname(name):
+        return name
+
+    return shutil.which(name, path=path)
+
+
+def _fast_spawn_executable(command: Union[str, Iterable], shell: bool, cwd, env: Optional[Dict[str, str]]) -> Optional[str]:
+    # The posix_spawn is used by subprocess only when the executable is given as path and the child setup is trivial:
+    # no cwd change, no fds closing and no preexec_fn. When it's not possible fallback to standard spawn is used.
+    if shell or cwd is not None or isinstance(command, (str, bytes)) or not command:
+        return None
+
+    search_path = (env if env is not None else os.environ).get('PATH', os.defpath)
+    return _resolve_executable(str(command[0]), search_path)
+
+
+def _popen(command: Union[str, Iterable], fast_spawn=False, **kwargs) -> _ResourceTrackingPopen:
+    """
+    Creates new process with subprocess.Popen.
+
+    When the `fast_spawn` is set and the spawn does not require any extra setup in the child process
+    the process is created with posix_spawn (no page tables copying, which makes the spawn latency independent
+    from the parent process memory size). The executable is resolved using PATH in such case and the file descriptors
+    are not closed in child process (python creates non-inheritable descriptors by default).
+
+    The returned process collects the resource usage when reaped (see `_ResourceTrackingPopen`).
+    """
+    if fast_spawn:
+        executable = _fast_spawn_executable(command, kwargs.get('shell', False), kwargs.get('cwd'), kwargs.get('env'))
+        if executable:
+            kwargs.update(executable=executable, close_fds=False)
+
+    return _ResourceTrackingPopen(command, **kwargs)
@@ -1,30 +1,140 @@
+import os
+import signal
 import subprocess
-from typing import Union, Iterable
+from collections import deque
+from threading import Thread
+from typing import Union, Iterable, Optional
 
-from pyshrimp.utils.string_wrapper import StringWrapper
-from pyshrimp.utils.subprocess_utils import ProcessExecutionResult
+# noinspection PyProtectedMember
+from pyshrimp._internal.utils.process_spawning import _popen
+# noinspection PyProtectedMember
+from pyshrimp.utils.output_capture import _decode_text_output
+# noinspection PyProtectedMember
+from pyshrimp.utils.resource_usage import _notify_execution_listeners
+# noinspection PyProtectedMember
+from pyshrimp.utils.subprocess_utils import ProcessExecutionResult, _wrap_output, _resource_usage_of
+
+
+class _TailBuffer:
+    """
+    Keeps only the last `max_bytes` of the written data.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._chunks = deque()
+        self._size = 0
+        self.truncated = False
+
+    def write(self, chunk: bytes):
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        while self._chunks and self._size - len(self._chunks[0]) >= self._max_bytes:
+            self._size -= len(self._chunks.popleft())
+            self.truncated = True
+
+    def value(self) -> bytes:
+        data = b''.join(self._chunks)
+        if len(data) > self._max_bytes:
+            self.truncated = True
+            data = data[len(data) - self._max_bytes:]
+
+        return data
 
 
 class _ExecutingProcess:
 
-    def __init__(self, command: Union[str, Iterable], process: subprocess.Popen) -> None:
+    def __init__(self, command: Union[str, Iterable], process: subprocess.Popen, binary=False,
+                 err_tail_bytes: Optional[int] = None, process_group=False) -> None:
+        """
+        :param err_tail_bytes: when set only the last bytes of the error output are kept
+        :param process_group: the process leads its own process group - the whole group is killed by `kill`
+        """
         self._process = process
+        self._process_group = process_group
         self._command = command
+        self._binary = binary
+        self._err_tail_bytes = err_tail_bytes
         self._closed = False
         self._result = None
+        self._err = None
+        self._err_thread = None
 
-    def close(self, timeout=None) -> ProcessExecutionResult:
-        # TODO: try catch
+        if process.stderr is not None:
+            # stderr is drained right away - the process must not block on it while its stdout is consumed by the next stage
+            self._err_stream = process.stderr
+            process.stderr = None
+            self._err_thread = Thread(target=self._drain_err, daemon=True)
+            self._err_thread.start()
+
+    def _drain_err(self):
+        try:
+            if self._err_tail_bytes is None:
+                self._err = self._err_stream.read()
+            else:
+                self._err = self._drain_err_tail()
+        finally:
+            self._err_stream.close()
 
+    def _drain_err_tail(self):
+        tail = _TailBuffer(self._err_tail_bytes)
+        stream = self._err_stream if self._binary else self._err_stream.buffer
+        for chunk in iter(lambda: stream.read1(65536), b''):
+            tail.write(chunk)
+
+        data = tail.value()
+        # decoded as the whole error output would be - the tail may start in the middle of multi-byte character
+        return data if self._binary else _decode_text_output(data, self._err_stream.encoding, errors='replace')
+
+    def close(self, timeout=None) -> ProcessExecutionResult:
+        """
+        Waits for the process and returns its result. When the process does not finish within the `timeout` it is killed
+        and the `TimeoutExpired` is reported as the exception of the result.
+        """
         if not self._closed:
-            (out, err) = self._process.communicate(timeout=timeout)
-            self._result = ProcessExecutionResult(
-                self._command, StringWrapper(out), StringWrapper(err), self._process.returncode
+            exception = None
+            try:
+                (out, _) = self._process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired as ex:
+                exception = ex
+                self.kill()
+                (out, _) = self._process.communicate()
+
+            err = None
+            if self._err_thread is not None:
+                self._err_thread.join()
+                err = self._err
+            self._result = _notify_execution_listeners(
+                ProcessExecutionResult(
+                    self._command, _wrap_output(out, self._binary), _wrap_output(err, self._binary), self._process.returncode,
+                    exception=exception, resource_usage=_resource_usage_of(self._process)
+                )
             )
             self._closed = True
 
         return self._result
 
+    def result_if_finished(self, timeout: float) -> Optional[ProcessExecutionResult]:
+        """
+        Returns the result of the finished process without closing it (the output is not read) - safe to call
+        from other thread. None is returned when the process does not finish within the `timeout`.
+        """
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return None
+
+        err = None
+        if self._err_thread is not None:
+            # the error output may be still held open by the children of the process
+            self._err_thread.join(timeout)
+            err = self._err
+
+        return ProcessExecutionResult(
+            self._command, _wrap_output(None, self._binary), _wrap_output(err, self._binary), self._process.returncode,
+            resource_usage=_resource_usage_of(self._process)
+        )
+
     @property
     def stdout(self):
         return self._process.stdout
@@ -32,8 +142,22 @@ class _ExecutingProcess:
     def detach_stdout(self):
         self._process.stdout = None
 
-    def send_signal(self, signal):
-        self._process.send_signal(signal)
+    def send_signal(self, sig):
+        self._process.send_signal(sig)
+
+    def kill(self):
+        """
+        Kills the process (with all the processes of its group when it leads one). Safe to call from other thread.
+        """
+        try:
+            if self._process_group:
+                # the children may outlive the group leader (e.g. the shell) - the group is signalled anyway
+                os.killpg(self._process.pid, signal.SIGKILL)
+            elif self._process.poll() is None:
+                self._process.kill()
+        except ProcessLookupError:
+            # already gone
+            pass
 
     @property
     def process(self) -> subprocess.Popen:
@@ -44,19 +168,25 @@ class _ExecutingProcess:
         return self._process.pid
 
 
-def _spawn_process(command: Union[str, Iterable], cmd_in=None, cwd=None, env=None, capture_output=False, capture_err_output=False) -> _ExecutingProcess:
+def _spawn_process(command: Union[str, Iterable], cmd_in=None, cwd=None, env=None, capture_output=False, capture_err_output=False,
+                   binary=False, fast_spawn=False, err_tail_bytes: Optional[int] = None, process_group=False) -> _ExecutingProcess:
+    """
+    :param process_group: when set the process is started in new session (leading its own process group),
+                          so it can be killed together with its children
+    """
     # TODO: support for string stdin?
     # TODO: try catch support
-    process = subprocess.Popen(
+    process = _popen(
         command,
+        fast_spawn=fast_spawn,
         stdin=subprocess.DEVNULL if cmd_in is None else cmd_in,
         stdout=subprocess.PIPE if capture_output else None,
         stderr=subprocess.PIPE if capture_err_output else None,
-        # TODO: binary output support
-        universal_newlines=True,
+        universal_newlines=not binary,
         shell=False,
         cwd=cwd,
-        env=env
+        env=env,
+        start_new_session=process_group
     )
 
-    return _ExecutingProcess(command, process)
+    return _ExecutingProcess(command, process, binary=binary, err_tail_bytes=err_tail_bytes, process_group=process_group)
@@ -0,0 +1,79 @@
+import json
+from typing import Any, List, Optional
+
+from pyshrimp.utils.dotdict import DotDict, as_dot_dict, unwrap_dot_dict
+
+
+class PipelineCodec:
+    """
+    Converts the objects flowing through the object-mode pipeline to text lines (and back).
+    The conversion happens only at the text boundaries - when the objects are passed to the command
+    or when the command (text) output is consumed by python stage.
+    """
+
+    def encode(self, obj: Any) -> str:
+        """
+        Returns text line (including the new line character) representing the object.
+        """
+        raise NotImplementedError()
+
+    def decode(self, line: str) -> Any:
+        """
+        Returns object represented by the line (the line includes the new line character).
+        """
+        raise NotImplementedError()
+
+
+def _json_default(obj):
+    if isinstance(obj, DotDict):
+        return unwrap_dot_dict(obj)
+
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class JsonLinesCodec(PipelineCodec):
+    """
+    Each line holds single JSON document (JSON lines format).
+
+    :param dot_dict: when set the decoded JSON objects are wrapped with `DotDict`
+    """
+
+    def __init__(self, dot_dict=False):
+        self._dot_dict = dot_dict
+
+    def encode(self, obj: Any) -> str:
+        return json.dumps(obj, default=_json_default) + '\n'
+
+    def decode(self, line: str) -> Any:
+        obj = json.loads(line)
+        return as_dot_dict(obj, 'line') if self._dot_dict and isinstance(obj, dict) else obj
+
+
+class TsvCodec(PipelineCodec):
+    """
+    Each line holds tab separated values. The lines are decoded to tuples of strings, or to dicts
+    when the column names are provided. Tuples, lists and dicts (values in the order of columns) can be encoded.
+    """
+
+    def __init__(self, columns: Optional[List[str]] = None, separator='\t'):
+        self._columns = columns
+        self._separator = separator
+
+    def encode(self, obj: Any) -> str:
+        if isinstance(obj, DotDict):
+            obj = unwrap_dot_dict(obj)
+
+        if isinstance(obj, dict):
+            obj = [obj.get(c) for c in self._columns] if self._columns else list(obj.values())
+
+        elif isinstance(obj, str):
+            obj = [obj]
+
+        return self._separator.join('' if el is None else str(el) for el in obj) + '\n'
+
+    def decode(self, line: str) -> Any:
+        values = tuple(line.rstrip('\r\n').split(self._separator))
+        return dict(zip(self._columns, values)) if self._columns else values
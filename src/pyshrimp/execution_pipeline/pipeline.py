@@ -1,95 +1,362 @@
+import asyncio
 import inspect
+import io
 import os
+import signal
 import sys
+import time
+from concurrent.futures import Executor
 from threading import Thread
-from typing import Callable, List
+from typing import Callable, List, AnyStr, Optional, Dict, Any
 
 # noinspection PyProtectedMember
 from pyshrimp._internal.pipes.async_function import _AsyncFunctionPipelineElement
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.instrumentation import _ConnectionStats, _MeasuredLines, _start_relay
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.iterator_function import _IteratorFunctionPipelineElement, _LineIterator, _IteratorReader, _as_line_iterator
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.utils import _set_pipe_size, _open_data_as_fd, _fileno_of, _forward_fd, _write_all
 from pyshrimp.exception import IllegalStateException, IllegalArgumentException
-from pyshrimp.execution_pipeline.pipeline_api import PipelineElement, StringPipelineElement, StreamPipelineElement, PipelineExecutionResult, PipelineTerminator, PipelineTerminatorStdout
-from pyshrimp.utils.command import cmd, shell_cmd
+from pyshrimp.execution_pipeline.pipeline_api import PipelineElement, StringPipelineElement, StreamPipelineElement, PipelineExecutionResult, PipelineTerminator, \
+    PipelineTerminatorStdout, PipelineTerminatorIter, PipelineStageResult, FilePipelineElement, PipelineTerminatorFile
+from pyshrimp.execution_pipeline.codecs import PipelineCodec
+# noinspection PyProtectedMember
+from pyshrimp.utils.command import cmd, shell_cmd, Command, _CommandPipelineElement
+from pyshrimp.utils.subprocess_utils import ProcessExecutionResult
+
+
+# time given to the cancelled stages to stop
+_CANCEL_GRACE_SEC = 1.0
+# time given to each killed process which was not closed (e.g. to collect its error output)
+_CANCEL_WAIT_SEC = 0.1
+
+
+def _stage_name(stage) -> str:
+    if isinstance(stage, Command):
+        # noinspection PyProtectedMember
+        return stage._display_name()
+
+    return getattr(stage, '__name__', None) or type(stage).__name__
+
+
+# not available on Windows - the processes are not stopped by the signal there
+_SIGPIPE = getattr(signal, 'SIGPIPE', None)
+
+
+def _stage_return_code(stage: PipelineStageResult, stopped_by_consumer_allowed: bool) -> int:
+    # upstream stage stopped because the consumer exited early (e.g. head) is not a failure
+    if stage.return_code is not None:
+        if stopped_by_consumer_allowed and _SIGPIPE is not None and stage.return_code in (-_SIGPIPE, 128 + _SIGPIPE):
+            return 0
+
+        return stage.return_code
+
+    if stage.exception is not None:
+        return 0 if stopped_by_consumer_allowed and isinstance(stage.exception, BrokenPipeError) else 1
+
+    return 0
+
+
+_FUNCTION_ASYNC = 'async'
+_FUNCTION_ITERATOR = 'iterator'
+_FUNCTION_SYNC = 'sync'
+
+
+def _function_kind(fn) -> str:
+    """
+    Recognizes the kind of function stage by its signature (see `ExecutionPipeline.attach_function`).
+    """
+    fn_args = dict(inspect.signature(fn).parameters.items())
+
+    if 'stream_input' in fn_args and 'stream_output' in fn_args:
+        return _FUNCTION_ASYNC
+
+    if 'stream_input' in fn_args or 'stream_output' in fn_args:
+        raise IllegalArgumentException(
+            f'Asynchronous function must accept both stream_input and stream_output but found only one.'
+            f' Function args: {", ".join(fn_args.keys())}'
+        )
+
+    if inspect.isgeneratorfunction(fn) or 'lines' in fn_args:
+        return _FUNCTION_ITERATOR
+
+    return _FUNCTION_SYNC
 
 
 class ExecutionPipeline:
 
-    def __init__(self) -> None:
+    def __init__(self, binary=False, pipe_buffer_size: Optional[int] = None, instrument=False,
+                 stderr_tail_bytes: Optional[int] = 64 * 1024, pipefail=False, codec: Optional[PipelineCodec] = None,
+                 process_groups=False) -> None:
+        """
+        :param binary: when set the data flows through the pipeline as raw bytes - the commands are executed in binary
+                       mode, the functions receive bytes and binary streams and the collected output is bytes
+        :param pipe_buffer_size: kernel buffer size of the pipes connecting the stages (Linux only, by default 64 KiB),
+                                 bigger buffers help high-throughput stages which write in bursts
+        :param instrument: when set the traffic between the stages is measured (bytes, lines, wait times) and reported
+                           in the `stages` of the result - the data between processes is copied by the relay thread
+        :param stderr_tail_bytes: amount of the error output kept for each command (the tail is kept),
+                                  None keeps whole error output
+        :param pipefail: when set the pipeline fails when any stage fails (like `set -o pipefail` in bash),
+                         otherwise the exit code of the last stage is the exit code of the pipeline
+        :param codec: enables object mode - the generator stages exchange python objects, the codec converts them
+                      from/to text lines only when they are passed to/from commands
+        :param process_groups: when set each command is started in its own process group (new session), so the cancelled
+                               pipeline kills also the processes spawned by the commands (e.g. by the shell) - note such
+                               commands do not receive the signals sent from the terminal (Ctrl+C)
+        """
+        if codec is not None and binary:
+            raise IllegalArgumentException('Object mode (codec) is not supported in binary pipeline.')
+
+        self._options = dict(
+            binary=binary, pipe_buffer_size=pipe_buffer_size, instrument=instrument,
+            stderr_tail_bytes=stderr_tail_bytes, pipefail=pipefail, codec=codec, process_groups=process_groups
+        )
         self._items: List[PipelineElement] = []
+        self._binary = binary
+        self._pipe_buffer_size = pipe_buffer_size
+        self._instrument = instrument
+        self._stderr_tail_bytes = stderr_tail_bytes
+        self._pipefail = pipefail
+        self._codec = codec
+        self._process_groups = process_groups
+        self._sub_pipelines: List['ExecutionPipeline'] = []
+        self._names: List[str] = []
+        self._attached_at: List[float] = []
+        self._closed_at: Dict[int, float] = {}
+        # traffic measurements keyed by the index of the consuming stage
+        self._connections: Dict[int, _ConnectionStats] = {}
+        # values reported by the stages, keyed by the index of the stage
+        self._stage_values: Dict[int, Any] = {}
+
+    def _append(self, element: PipelineElement, name: str):
+        self._items.append(element)
+        self._names.append(name)
+        self._attached_at.append(time.perf_counter())
 
     def attach_stdin(self):
         if self._items:
             raise IllegalStateException('Attaching STDIN makes only sense at the start of pipeline.')
 
-        self._items.append(StreamPipelineElement(sys.stdin))
+        self._append(StreamPipelineElement(sys.stdin.buffer if self._binary else sys.stdin), 'stdin')
         return self
 
-    def attach_text(self, text: str):
+    def attach_text(self, text: AnyStr):
         if self._items:
             raise IllegalStateException('Attaching text makes only sense at the start of pipeline.')
 
-        self._items.append(StringPipelineElement(text))
+        self._append(StringPipelineElement(text), 'text')
         return self
 
-    def attach_function(self, fn):
-        fn_args = dict(inspect.signature(fn).parameters.items())
+    def attach_file(self, path: str):
+        """
+        Feeds the pipeline with the file content. The command consuming it reads the file directly (file descriptor
+        is passed as its stdin).
+        """
+        if self._items:
+            raise IllegalStateException('Attaching file makes only sense at the start of pipeline.')
 
-        if 'stream_input' in fn_args and 'stream_output' in fn_args:
-            # async function
-            self._attach_async_connector(
-                connect_method=lambda left_out: _AsyncFunctionPipelineElement(function=fn, left_out=left_out)
+        self._append(FilePipelineElement(path, binary=self._binary), path)
+        return self
+
+    def attach_function(self, fn):
+        """
+        Attaches python function to the pipeline. The kind of stage is recognized by the function signature:
+         - function accepting `stream_input` and `stream_output` is executed in background thread
+         - generator function or function accepting `lines` receives the iterator over upstream lines
+           and returns iterable of output chunks - it is executed lazily, as the output is consumed
+         - any other function receives the whole upstream output as string
+        """
+        return self._attach_function_of_kind(fn, _function_kind(fn))
+
+    def _attach_function_of_kind(self, fn, kind: str):
+        if kind == _FUNCTION_ASYNC:
+            self._attach_python_connector(
+                connect_method=lambda left_out: _AsyncFunctionPipelineElement(
+                    function=fn, left_out=self._as_stream_input(left_out), binary=self._binary
+                ),
+                name=_stage_name(fn),
+                consumes_objects=False
             )
 
-        elif 'stream_input' in fn_args or 'stream_output' in fn_args:
-            # invalid async function
-            raise IllegalArgumentException(
-                f'Asynchronous function must accept both stream_input and stream_output but found only one.'
-                f' Function args: {", ".join(fn_args.keys())}'
+        elif kind == _FUNCTION_ITERATOR:
+            self._attach_python_connector(
+                connect_method=lambda left_out: _IteratorFunctionPipelineElement(
+                    function=fn, left_out=left_out, binary=self._binary, objects=self._codec is not None
+                ),
+                name=_stage_name(fn),
+                consumes_objects=True
             )
 
         else:
-            # sync function
             self._attach_sync_connector(
-                connect_method=lambda left_out: StringPipelineElement(fn(left_out))
+                connect_method=lambda left_out: StringPipelineElement(fn(left_out)),
+                name=_stage_name(fn)
             )
 
         return self
 
+    def _set_stage_result(self, value):
+        """
+        Sets the value reported as `result` of the last attached stage - used by composite stages (e.g. tee).
+        """
+        self._stage_values[len(self._items) - 1] = value
+
     def _get_left(self):
         return self._items[-1] if self._items else None
 
-    def _attach_async_connector(self, connect_method):
+    def _sub_pipeline(self) -> 'ExecutionPipeline':
+        """
+        Creates empty pipeline with the same options - used by the stages running nested pipelines (e.g. tee).
+        """
+        sub_pipeline = ExecutionPipeline(**self._options)
+        # cancelled together with this pipeline
+        self._sub_pipelines.append(sub_pipeline)
+        return sub_pipeline
+
+    def _attach_async_connector(self, connect_method, name: str):
         left = self._get_left()
         left_out = left.stdout_for_pipe() if left else None
-
+        input_fd = None
+        relayed = False
+
+        if left_out is not None:
+            left_out = self._convert_objects(left, left_out, to_objects=False)
+
+        if self._instrument and left_out is not None:
+            left_out, relayed = self._measure_connection(left, left_out, for_process=True)
+            if relayed:
+                input_fd = left_out
+
+        if isinstance(left_out, (str, bytes)):
+            # Connector expects to see streaming input, pass the text as readable descriptor
+            input_fd = _open_data_as_fd(left_out, self._pipe_buffer_size)
+            left_out = input_fd
+
+        elif isinstance(left_out, _LineIterator):
+            # in-process stage output has to be written to pipe for the process
+            input_fd = self._feed_lines_to_pipe(left_out)
+            left_out = input_fd
+
+        self._tune_pipe(left_out)
+        self._append(connect_method(left_out), name)
+
+        if isinstance(self._items[-1], _CommandPipelineElement):
+            # the process holds its own copy of the input descriptor
+            if input_fd is not None:
+                os.close(input_fd)
+
+            elif left and not relayed:
+                left.on_stdout_passed_to_process()
+
+    @staticmethod
+    def _feed_lines_to_pipe(lines: _LineIterator) -> int:
+        pipe_r, pipe_w = os.pipe()
+
+        def _write_to_pipe():
+            try:
+                with io.open(pipe_w, 'wb') as out:
+                    for chunk in lines:
+                        out.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            except BrokenPipeError:
+                # the consumer has exited before reading whole input
+                pass
+            finally:
+                lines.close()
+
+        Thread(target=_write_to_pipe, daemon=True).start()
+        return pipe_r
+
+    def _as_stream_input(self, left_out):
         if isinstance(left_out, str):
-            # Connector expects to see streaming input, transform the string to TextIO
-            pipe_r, pipe_w = os.pipe()
+            return io.StringIO(left_out)
+
+        if isinstance(left_out, bytes):
+            return io.BytesIO(left_out)
+
+        if isinstance(left_out, _LineIterator):
+            return _IteratorReader(left_out, binary=self._binary)
+
+        return left_out
+
+    def _attach_python_connector(self, connect_method, name: str, consumes_objects: bool):
+        # python stages consume the upstream output in-process - no pipe is needed between them
+        left = self._get_left()
+        left_out = left.stdout_for_python() if left else None
+        self._tune_pipe(left_out)
+        if self._instrument and left_out is not None:
+            left_out, _ = self._measure_connection(left, left_out, for_process=False)
+
+        if left_out is not None:
+            left_out = self._convert_objects(left, left_out, to_objects=consumes_objects)
+
+        self._append(connect_method(left_out), name)
+
+    def _produces_objects(self, element: PipelineElement) -> bool:
+        if self._codec is None:
+            return False
+
+        if isinstance(element, StringPipelineElement):
+            # result of the sync function
+            return not isinstance(element.stdout_for_pipe(), (str, bytes))
+
+        return isinstance(element, _IteratorFunctionPipelineElement)
 
-            input_for_pipe = left_out
+    def _convert_objects(self, left: PipelineElement, left_out, to_objects: bool):
+        """
+        In object mode converts the output of the last stage to what the next stage consumes (objects or text lines).
+        """
+        if self._codec is None or self._produces_objects(left) == to_objects:
+            return left_out
 
-            def _write_to_pipe():
-                os.write(pipe_w, input_for_pipe.encode('utf-8'))
-                os.close(pipe_w)
+        lines = _as_line_iterator(left_out, self._binary)
+        if to_objects:
+            objects = (self._codec.decode(line) for line in lines if line.strip())
+            return _LineIterator(objects, on_close=lines.close)
 
-            # write to pipe in new thread
-            # this should workaround any deadlock situations
-            Thread(target=_write_to_pipe).start()
+        return _LineIterator((self._codec.encode(obj) for obj in lines), on_close=lines.close)
 
-            left_out = pipe_r
+    def _measure_connection(self, left: PipelineElement, left_out, for_process: bool):
+        """
+        Wraps the output of the last stage so the traffic to the next stage is measured.
+        Returns the new output and flag telling whether the relay thread took over the output stream.
+        """
+        stats = self._connections[len(self._items)] = _ConnectionStats()
 
-        self._items.append(connect_method(left_out))
+        if isinstance(left_out, (str, bytes)):
+            stats.add(left_out)
+            stats.finish()
+            return left_out, False
 
-    def _attach_sync_connector(self, connect_method: Callable[[str], PipelineElement]):
+        if isinstance(left_out, _LineIterator):
+            return _MeasuredLines(left_out, stats), False
+
+        if for_process and _fileno_of(left_out) is not None:
+            relay_fd = _start_relay(left_out, stats, on_done=left.on_stdout_passed_to_process)
+            self._tune_pipe(relay_fd)
+            return relay_fd, True
+
+        return _MeasuredLines(_as_line_iterator(left_out, self._binary), stats), False
+
+    def _tune_pipe(self, left_out):
+        if self._pipe_buffer_size and left_out is not None:
+            _set_pipe_size(left_out, self._pipe_buffer_size)
+
+    def _attach_sync_connector(self, connect_method: Callable[[str], PipelineElement], name: str):
         left = self._get_left()
 
         # We need to consume output as the connector does not support streaming
         if left:
             left.close()
+            self._closed_at[len(self._items) - 1] = time.perf_counter()
             left_out = left.result.stdout
+            if self._instrument:
+                self._measure_connection(left, left_out, for_process=False)
         else:
             left_out = None
 
-        self._items.append(connect_method(left_out))
+        self._append(connect_method(left_out), name)
 
     def attach(self, right):
         if isinstance(right, PipelineTerminator):
@@ -98,11 +365,18 @@ class ExecutionPipeline:
         elif isinstance(right, PipelineTerminatorStdout):
             return self.close().stdout
 
+        elif isinstance(right, PipelineTerminatorIter):
+            return self.iter_lines()
+
+        elif isinstance(right, PipelineTerminatorFile):
+            return self.close_to_file(right.path, right.append)
+
         elif isinstance(right, str):
             self.attach(
                 shell_cmd(
                     script=right,
-                    check=False
+                    check=False,
+                    binary=self._binary
                 )
             )
 
@@ -110,15 +384,31 @@ class ExecutionPipeline:
             self.attach(
                 cmd(
                     command=right,
-                    check=False
+                    check=False,
+                    binary=self._binary
                 )
             )
 
+        elif isinstance(right, Command) and self._binary and not right.binary:
+            self.attach(right.with_binary())
+
+        elif isinstance(right, Command):
+            self._attach_async_connector(
+                connect_method=lambda left_out: right.pipe_connect_async(
+                    left_out, stderr_tail_bytes=self._stderr_tail_bytes, process_group=self._process_groups
+                ),
+                name=_stage_name(right)
+            )
+
         elif hasattr(right, 'pipe_connect_async'):
-            self._attach_async_connector(right.pipe_connect_async)
+            self._attach_async_connector(right.pipe_connect_async, _stage_name(right))
 
         elif hasattr(right, 'pipe_connect_sync'):
-            self._attach_sync_connector(right.pipe_connect_sync)
+            self._attach_sync_connector(right.pipe_connect_sync, _stage_name(right))
+
+        elif hasattr(right, 'pipe_attach_to'):
+            # composite stage (e.g. tee) attaching its own elements
+            right.pipe_attach_to(self)
 
         elif callable(right):
             self.attach_function(right)
@@ -134,11 +424,212 @@ class ExecutionPipeline:
 
         return self
 
-    def close(self) -> PipelineExecutionResult:
-        for el in self._items:
-            el.close()
+    def close(self, timeout: Optional[float] = None) -> PipelineExecutionResult:
+        """
+        Waits for all the stages and returns the result of the pipeline.
+
+        :param timeout: maximal time [s] to wait - when it expires the pipeline is cancelled (see `cancel`)
+                        and the result is flagged with `timed_out` (the stages which did not stop are reported
+                        with `TimeoutError`)
+        """
+        if timeout is None:
+            return self._close_stages()
+
+        outcome = {}
+
+        def _close():
+            try:
+                outcome['result'] = self._close_stages()
+            except BaseException as ex:
+                outcome['exception'] = ex
+
+        closing = Thread(target=_close, daemon=True)
+        closing.start()
+        closing.join(timeout)
+        if not closing.is_alive():
+            return self._closing_outcome(outcome)
+
+        self.cancel()
+        closing.join(_CANCEL_GRACE_SEC)
+        if closing.is_alive():
+            # some stage ignored the cancellation (e.g. the python function which never writes) - it is left behind
+            return self._partial_result()
+
+        result = self._closing_outcome(outcome)
+        result.timed_out = True
+        return result
+
+    @staticmethod
+    def _closing_outcome(outcome: dict) -> PipelineExecutionResult:
+        if 'exception' in outcome:
+            raise outcome['exception']
+
+        return outcome['result']
+
+    def cancel(self):
+        """
+        Stops all the stages (may be called from other thread): the processes are killed, the channels feeding
+        the python stages are closed (the functions get `BrokenPipeError` on the next write). The python threads cannot
+        be interrupted - the function blocked elsewhere is left running. The pipeline still has to be closed.
+        """
+        for sub_pipeline in self._sub_pipelines:
+            sub_pipeline.cancel()
+
+        for element in self._items:
+            element.cancel()
+
+    def _partial_result(self) -> PipelineExecutionResult:
+        stages = []
+        for i, element in enumerate(self._items):
+            # the stages are closed from the end - the upstream stages may have already stopped without being closed
+            element_result = None if i in self._closed_at else element.result_after_cancel(_CANCEL_WAIT_SEC)
+            if i in self._closed_at or element_result is not None:
+                stages.append(self._stage_result(i, element_result))
+            else:
+                stages.append(PipelineStageResult(name=self._names[i], exception=TimeoutError('Stage did not stop after cancellation')))
+
+        return PipelineExecutionResult(
+            stdout=None,
+            stderr=None,
+            result=None,
+            exception=TimeoutError('Pipeline timed out'),
+            stages=stages,
+            return_code=self._return_code(stages),
+            timed_out=True
+        )
+
+    def _close_stages(self, stopped_by_consumer=False) -> PipelineExecutionResult:
+        """
+        :param stopped_by_consumer: the output was not read to the end - the last stage stopped by SIGPIPE
+                                    (or BrokenPipeError) is not a failure
+        """
+        # the lazy stages are driven by their consumers - start closing from the end of the pipeline
+        for i in reversed(range(len(self._items))):
+            self._items[i].close()
+            self._closed_at.setdefault(i, time.perf_counter())
+
+        result = self._get_left().result
+        if self._instrument and len(self._items) not in self._connections:
+            # the output of the last stage was collected (not streamed)
+            self._measure_connection(self._get_left(), result.stdout, for_process=False)
+
+        result.stages = [self._stage_result(i) for i in range(len(self._items))]
+        result.return_code = self._return_code(result.stages, stopped_by_consumer)
+        return result
+
+    def _return_code(self, stages: List[PipelineStageResult], stopped_by_consumer=False) -> int:
+        return_codes = [
+            _stage_return_code(stage, stopped_by_consumer_allowed=stopped_by_consumer or i < len(stages) - 1)
+            for i, stage in enumerate(stages)
+        ]
+
+        if not self._pipefail:
+            return return_codes[-1]
+
+        # the rightmost failure is reported - same as bash does
+        failed = [rc for rc in return_codes if rc != 0]
+        return failed[-1] if failed else 0
+
+    def _stage_result(self, index: int, element_result: Optional[PipelineExecutionResult] = None) -> PipelineStageResult:
+        element_result = element_result or self._items[index].result
+        process_result = element_result.result if isinstance(element_result.result, ProcessExecutionResult) else None
+        stage = PipelineStageResult(
+            name=self._names[index],
+            return_code=process_result.return_code if process_result else None,
+            exception=element_result.exception,
+            resource_usage=process_result.resource_usage if process_result else None,
+            stderr=element_result.stderr,
+            result=self._stage_values.get(index)
+        )
+
+        if self._instrument:
+            stats_in = self._connections.get(index)
+            stats_out = self._connections.get(index + 1)
+            if stage.resource_usage is not None:
+                stage.wall_time_sec = stage.resource_usage.wall_time_sec
+            else:
+                finished_at = stats_out.finished_at if stats_out and stats_out.finished_at else self._closed_at.get(index, time.perf_counter())
+                stage.wall_time_sec = finished_at - self._attached_at[index]
+
+            if stats_in:
+                stage.bytes_in, stage.lines_in, stage.read_blocked_sec = stats_in.bytes, stats_in.lines, stats_in.consumer_wait_sec
+
+            if stats_out:
+                stage.bytes_out, stage.lines_out, stage.write_blocked_sec = stats_out.bytes, stats_out.lines, stats_out.producer_wait_sec
+
+        return stage
+
+    def close_to_file(self, path: str, append=False) -> PipelineExecutionResult:
+        """
+        Writes the output of the last stage to the file and closes the pipeline. The output of the command is moved
+        to the file within the kernel (splice) - the data does not flow through python.
+        """
+        left = self._get_left()
+        left_out = left.stdout_for_pipe() if left else None
+        if left_out is not None:
+            left_out = self._convert_objects(left, left_out, to_objects=False)
+
+        if self._instrument and left_out is not None:
+            left_out, _ = self._measure_connection(left, left_out, for_process=False)
+
+        # O_APPEND is not used - splice does not support it, the position is moved to the end instead
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | (0 if append else os.O_TRUNC), 0o666)
+        try:
+            if append:
+                os.lseek(fd, 0, os.SEEK_END)
+
+            self._write_output(left_out, fd)
+        finally:
+            os.close(fd)
+
+        return self.close()
+
+    @staticmethod
+    def _write_output(left_out, fd: int):
+        if left_out is None:
+            return
+
+        if isinstance(left_out, (str, bytes)):
+            _write_all(fd, left_out.encode('utf-8') if isinstance(left_out, str) else left_out)
+            return
+
+        if not isinstance(left_out, _LineIterator) and _fileno_of(left_out) is not None:
+            _forward_fd(_fileno_of(left_out), fd)
+            return
+
+        lines = _as_line_iterator(left_out)
+        try:
+            for chunk in lines:
+                _write_all(fd, chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        finally:
+            lines.close()
+
+    def iter_lines(self) -> 'PipelineOutputStream':
+        """
+        Returns iterator over the output lines of the last stage - the lines are available as they are produced.
+        The pipeline is closed once the iteration is completed or the iterator is closed.
+        In object mode the iterator returns objects (the text output of the command is decoded).
+        """
+        left = self._get_left()
+        lines = _as_line_iterator(left.stdout_for_python() if left else None, self._binary)
+        if self._instrument:
+            lines, _ = self._measure_connection(left, lines, for_process=False)
+
+        if left:
+            lines = self._convert_objects(left, lines, to_objects=True)
 
-        return self._get_left().result
+        return PipelineOutputStream(self, lines)
+
+    async def close_async(self, timeout: Optional[float] = None, executor: Optional[Executor] = None) -> PipelineExecutionResult:
+        """
+        Closes the pipeline without blocking the event loop - the stages are awaited in the thread of the `executor`.
+        The thread is occupied until the pipeline finishes, so the number of pipelines awaited concurrently
+        is limited by the size of the executor (the default executor of the loop has `min(32, cpu_count + 4)` threads).
+
+        :param timeout: see `close`
+        :param executor: executor running the close, defaults to the default executor of the running loop
+        """
+        return await asyncio.get_running_loop().run_in_executor(executor, self.close, timeout)
 
     def __or__(self, other) -> 'ExecutionPipeline':
         return self.attach(other)
@@ -149,5 +640,60 @@ class ExecutionPipeline:
         )
 
 
+class PipelineOutputStream:
+    """
+    Iterator over the output of the pipeline. The memory usage stays bounded regardless of the amount of data produced.
+    The `result` becomes available once the stream is exhausted or closed. Closing the stream before
+    all the output was read stops the pipeline (the stages get SIGPIPE / BrokenPipeError when writing).
+    """
+
+    def __init__(self, pipeline: ExecutionPipeline, lines: _LineIterator) -> None:
+        self._pipeline = pipeline
+        self._lines = lines
+        self._result: Optional[PipelineExecutionResult] = None
+        self._exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> AnyStr:
+        if self._result is not None:
+            raise StopIteration()
+
+        try:
+            return next(self._lines)
+        except StopIteration:
+            self._exhausted = True
+            self.close()
+            raise
+
+    def close(self) -> PipelineExecutionResult:
+        if self._result is None:
+            self._lines.close()
+            # noinspection PyProtectedMember
+            self._result = self._pipeline._close_stages(stopped_by_consumer=not self._exhausted)
+
+        return self._result
+
+    @property
+    def result(self) -> Optional[PipelineExecutionResult]:
+        return self._result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        # the iteration was abandoned (e.g. break from the loop) - the stages still have to be finalized
+        if getattr(self, '_result', True) is None:
+            self.close()
+
+
 def pipe(*elements) -> PipelineExecutionResult:
     return ExecutionPipeline().attach_all(*elements).close()
+
+
+async def pipe_async(*elements, executor: Optional[Executor] = None) -> PipelineExecutionResult:
+    return await ExecutionPipeline().attach_all(*elements).close_async(executor=executor)
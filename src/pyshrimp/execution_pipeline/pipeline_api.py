@@ -1,9 +1,37 @@
 # noinspection PyMethodMayBeStatic
-from dataclasses import dataclass
-from typing import Optional, Any
+from dataclasses import dataclass, field
+from typing import Optional, Any, List, AnyStr
 
 # noinspection PyProtectedMember
 from pyshrimp._internal.pipes.utils import _collect_stream_to_string
+from pyshrimp.utils.resource_usage import ProcessResourceUsage
+
+
+@dataclass
+class PipelineStageResult:
+    """
+    Outcome of single pipeline stage. The traffic measurements are available only in instrumented pipeline.
+    The `read_blocked_sec` is the time the stage waited for the input, the `write_blocked_sec` is the time
+    the stage output waited for the next stage. The `result` is reported by composite stages (e.g. the results
+    of tee branches).
+    """
+    name: str
+    return_code: Optional[int] = None
+    exception: Optional[Exception] = None
+    stderr: Optional[AnyStr] = None
+    resource_usage: Optional[ProcessResourceUsage] = None
+    wall_time_sec: Optional[float] = None
+    bytes_in: Optional[int] = None
+    lines_in: Optional[int] = None
+    bytes_out: Optional[int] = None
+    lines_out: Optional[int] = None
+    read_blocked_sec: Optional[float] = None
+    write_blocked_sec: Optional[float] = None
+    result: Optional[Any] = None
+
+
+def _format_value(value, fmt=''):
+    return '-' if value is None else format(value, fmt)
 
 
 @dataclass
@@ -12,6 +40,32 @@ class PipelineExecutionResult:
     stderr: Optional[str]
     result: Optional[Any]
     exception: Optional[Exception]
+    stages: List[PipelineStageResult] = field(default_factory=list)
+    # exit code of the pipeline (set only for the result of the whole pipeline)
+    return_code: Optional[int] = None
+    # the pipeline was cancelled after its timeout expired - the result may be partial
+    timed_out: bool = False
+
+    def is_ok(self) -> bool:
+        return self.return_code == 0 and not self.timed_out
+
+    def report(self) -> str:
+        """
+        Returns human-readable summary of the stages - useful to find the bottleneck of instrumented pipeline.
+        """
+        lines = [
+            f'{"wall [s]":>9} {"in [B]":>12} {"in lines":>10} {"out [B]":>12} {"out lines":>10}'
+            f' {"read wait [s]":>13} {"write wait [s]":>14} {"rc":>4}  stage'
+        ]
+        for s in self.stages:
+            lines.append(
+                f'{_format_value(s.wall_time_sec, ".3f"):>9} {_format_value(s.bytes_in):>12} {_format_value(s.lines_in):>10}'
+                f' {_format_value(s.bytes_out):>12} {_format_value(s.lines_out):>10}'
+                f' {_format_value(s.read_blocked_sec, ".3f"):>13} {_format_value(s.write_blocked_sec, ".3f"):>14}'
+                f' {_format_value(s.return_code):>4}  {s.name}'
+            )
+
+        return '\n'.join(lines)
 
 
 class PipelineElement:
@@ -30,6 +84,31 @@ class PipelineElement:
     def stdout_for_pipe(self):
         raise NotImplementedError()
 
+    def stdout_for_python(self):
+        """
+        Output consumed by the python stage - the element may return in-process channel instead of the stream.
+        """
+        return self.stdout_for_pipe()
+
+    def on_stdout_passed_to_process(self):
+        """
+        Called once the output was passed to the spawned process - the element should release its own copy of the pipe,
+        so the writer gets SIGPIPE when the process stops reading.
+        """
+        pass
+
+    def cancel(self):
+        """
+        Stops the stage - called from other thread when the pipeline is cancelled, the `close` is still called afterwards.
+        """
+        pass
+
+    def result_after_cancel(self, timeout: float) -> Optional[PipelineExecutionResult]:
+        """
+        Result of the cancelled stage which was not closed (without blocking on it) - None when the stage is still running.
+        """
+        return self.result
+
     @property
     def result(self) -> PipelineExecutionResult:
         raise NotImplementedError
@@ -77,9 +156,58 @@ class StreamPipelineElement(PipelineElement):
         )
 
 
+class FilePipelineElement(PipelineElement):
+    """
+    Pipeline source reading the file. The command consuming the file gets the file descriptor as its stdin,
+    so the data never flows through python.
+    """
+
+    def __init__(self, path: str, binary=False) -> None:
+        super().__init__()
+        self._stream = open(path, 'rb') if binary else open(path, 'r', encoding='utf-8')
+        self._consumed = False
+        self._out_collected = None
+
+    def stdout_for_pipe(self):
+        self._consumed = True
+        return self._stream
+
+    def on_stdout_passed_to_process(self):
+        self._stream.close()
+
+    def _close_once(self):
+        if self._consumed:
+            self._stream.close()
+        else:
+            self._out_collected = _collect_stream_to_string(self._stream)
+
+    @property
+    def result(self) -> PipelineExecutionResult:
+        return PipelineExecutionResult(
+            result=None,
+            stdout=self._out_collected,
+            stderr=None,
+            exception=None
+        )
+
+
 class PipelineTerminator:
     pass
 
 
 class PipelineTerminatorStdout:
     pass
+
+
+class PipelineTerminatorIter:
+    pass
+
+
+class PipelineTerminatorFile:
+    """
+    Terminates the pipeline writing the output of the last stage to the file.
+    """
+
+    def __init__(self, path: str, append=False):
+        self.path = path
+        self.append = append
@@ -1,5 +1,9 @@
+from typing import AnyStr
+
+from pyshrimp.execution_pipeline.codecs import PipelineCodec, JsonLinesCodec
 from pyshrimp.execution_pipeline.pipeline import ExecutionPipeline
-from pyshrimp.execution_pipeline.pipeline_api import PipelineTerminator, PipelineTerminatorStdout
+from pyshrimp.execution_pipeline.pipeline_api import PipelineTerminator, PipelineTerminatorStdout, PipelineTerminatorIter, PipelineTerminatorFile
+from pyshrimp.execution_pipeline.template import PipelineTemplate, PipelineArg
 
 
 # noinspection PyMethodMayBeStatic
@@ -8,12 +12,34 @@ class PipelineStarter:
     def empty(self):
         return ExecutionPipeline()
 
+    def binary(self):
+        return ExecutionPipeline(binary=True)
+
+    def objects(self, codec: PipelineCodec = None):
+        return ExecutionPipeline(codec=codec or JsonLinesCodec())
+
     def stdin(self):
         return self.empty().attach_stdin()
 
-    def text(self, text: str):
+    def text(self, text: AnyStr):
         return self.empty().attach_text(text)
 
+    def file(self, path: str):
+        return self.empty().attach_file(path)
+
+    def template(self, *elements, **options) -> PipelineTemplate:
+        """
+        Defines pipeline executed many times, e.g. `PIPE.template(['grep', PIPE.arg('pattern')], 'sort').run(text, pattern='x')`.
+        The options are passed to the executed pipelines (see `ExecutionPipeline`).
+        """
+        return PipelineTemplate(elements, **options)
+
+    def arg(self, name: str) -> PipelineArg:
+        """
+        Placeholder for the argument of the list command in the template.
+        """
+        return PipelineArg(name)
+
     def close(self) -> PipelineTerminator:
         return PipelineTerminator()
 
@@ -27,3 +53,5 @@ class PipelineStarter:
 PIPE = PipelineStarter()
 PIPE_END = PipelineTerminator()
 PIPE_END_STDOUT = PipelineTerminatorStdout()
+PIPE_ITER = PipelineTerminatorIter()
+PIPE_TO_FILE = PipelineTerminatorFile
@@ -0,0 +1,291 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from itertools import islice, takewhile
+from threading import Thread
+from typing import Callable, Optional, Iterator, Iterable, List
+
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.channel import _open_queue_batch_channel
+from pyshrimp.exception import IllegalArgumentException, IllegalStateException
+from pyshrimp.execution_pipeline.pipeline_api import PipelineExecutionResult
+
+
+def _process_chunk(fn: Callable, chunk: List) -> List:
+    results = (fn(line) for line in chunk)
+    return [res for res in results if res is not None]
+
+
+def _iter_chunks(lines: Iterable, chunk_lines: int) -> Iterator[List]:
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_lines))
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def _worker_context():
+    # the pipeline threads are running (stderr drains, feeders) - forking them could deadlock the workers
+    start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(start_method)
+
+
+def _parallel_map(lines: Iterator, fn: Callable, workers: int, chunk_lines: int, ordered: bool):
+    # bounded number of chunks in flight - the input is not read ahead of the consumer
+    max_in_flight = workers * 2
+    chunks = _iter_chunks(lines, chunk_lines)
+    process_chunk = partial(_process_chunk, fn)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context()) as executor:
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(process_chunk, chunk))
+                while len(pending) >= max_in_flight:
+                    yield from _collect_next(pending, ordered)
+
+            while pending:
+                yield from _collect_next(pending, ordered)
+
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _collect_next(pending: deque, ordered: bool):
+    if ordered:
+        done = pending.popleft()
+    else:
+        done = next(iter(wait(pending, return_when=FIRST_COMPLETED).done))
+        pending.remove(done)
+
+    yield from done.result()
+
+
+def parallel_stage(fn: Callable, workers: Optional[int] = None, chunk_lines: int = 10000, ordered: bool = True):
+    """
+    Creates pipeline stage applying the function to each line in pool of worker processes.
+    Useful for CPU-bound transformations - the python stages are otherwise limited by GIL.
+
+    The function receives the line and returns the output (the line is dropped when None is returned).
+    It has to be picklable (defined at module level) - it is executed in other process.
+
+    :param workers: number of worker processes (defaults to number of CPUs)
+    :param chunk_lines: number of lines sent to the worker at once
+    :param ordered: when set the output keeps the order of input lines,
+                    otherwise the chunks are emitted as soon as processed
+    """
+    if chunk_lines < 1:
+        raise IllegalArgumentException(f'The chunk_lines must be positive, got: {chunk_lines}')
+
+    workers = workers or os.cpu_count() or 1
+
+    def _stage(lines):
+        yield from _parallel_map(lines, fn, workers, chunk_lines, ordered)
+
+    return _stage
+
+
+def head(n: int):
+    """
+    Creates pipeline stage passing only first `n` lines. The upstream is released as soon as the lines are read
+    - the processes get SIGPIPE on next write and the python stages are stopped.
+    """
+    if n < 0:
+        raise IllegalArgumentException(f'The number of lines must not be negative, got: {n}')
+
+    def _stage(lines):
+        yield from islice(lines, n)
+
+    return _stage
+
+
+def take_while(predicate: Callable[[str], bool]):
+    """
+    Creates pipeline stage passing the lines as long as they match the predicate. The upstream is released
+    on the first line not matching the predicate.
+    """
+
+    def _stage(lines):
+        yield from takewhile(predicate, lines)
+
+    return _stage
+
+
+def _as_elements(branch) -> tuple:
+    # the list is a command - multiple elements have to be passed as tuple
+    return branch if isinstance(branch, tuple) else (branch,)
+
+
+def _batching(queue_size: int) -> dict:
+    # the lines are passed between the threads in batches - up to `queue_size` lines are queued in total
+    max_batches = max(1, min(queue_size, 8))
+    return {'batch_size': max(1, queue_size // max_batches), 'max_batches': max_batches}
+
+
+class Tee:
+    """
+    Stage duplicating the stream into the branches - each branch is separate pipeline fed with the stream
+    in background thread. The stream is also passed unchanged to the next stage.
+
+    The branches are fed in batches of lines via bounded queues, so the slow branch throttles the producer. The branch which stopped
+    reading (e.g. ends with `head`) is not fed anymore, the stream is read until all the consumers stopped.
+    The results of the branches are reported as the `result` of the stage in the pipeline result.
+    """
+
+    def __init__(self, branches, queue_size: int):
+        self._branches = [_as_elements(b) for b in branches]
+        self._queue_size = queue_size
+
+    def pipe_attach_to(self, pipeline):
+        # the stage may be attached to multiple pipelines - the results are kept per pipeline
+        results: List[Optional[PipelineExecutionResult]] = [None] * len(self._branches)
+        writers = []
+        threads = []
+
+        for i, branch in enumerate(self._branches):
+            (writer,), reader = _open_queue_batch_channel(**_batching(self._queue_size))
+            # noinspection PyProtectedMember
+            branch_pipeline = pipeline._sub_pipeline()
+            branch_pipeline.attach_function(_channel_source(reader))
+            branch_pipeline.attach_all(*branch)
+
+            thread = Thread(target=_run_branch, args=(results, i, branch_pipeline), daemon=True)
+            thread.start()
+            writers.append(writer)
+            threads.append(thread)
+
+        def _send(line):
+            for writer in writers:
+                if not writer.reader_closed:
+                    try:
+                        writer.write(line)
+                    except BrokenPipeError:
+                        # the branch has stopped reading
+                        pass
+
+        def tee(lines):
+            try:
+                for line in lines:
+                    _send(line)
+                    yield line
+
+            finally:
+                # the next stage may stop reading early - the branches still get the rest of the stream
+                for line in lines:
+                    if all(writer.reader_closed for writer in writers):
+                        break
+
+                    _send(line)
+
+                for writer in writers:
+                    writer.close()
+
+                for thread in threads:
+                    thread.join()
+
+        pipeline.attach_function(tee)
+        # noinspection PyProtectedMember
+        pipeline._set_stage_result(results)
+
+
+def _run_branch(results: List[Optional[PipelineExecutionResult]], index: int, branch_pipeline):
+    results[index] = branch_pipeline.close()
+
+
+def _channel_source(reader):
+    def tee_branch(lines):
+        try:
+            yield from reader.iter_unwrapped()
+        finally:
+            reader.close()
+
+    return tee_branch
+
+
+def tee(*branches, queue_size: int = 1024) -> Tee:
+    """
+    Creates stage feeding the stream to multiple branches (sub-pipelines) in single pass, for example:
+
+        res = PIPE | 'zcat huge.gz' | tee(['wc', '-l'], (count_errors, 'sort')) | 'gzip' | PIPE_TO_FILE('copy.gz')
+        line_count, errors = res.stages[1].result
+
+    The branch is single element or tuple of elements (the list is a command).
+
+    :param queue_size: maximal number of lines buffered for each branch
+    """
+    return Tee(branches, queue_size)
+
+
+class Merge:
+    """
+    Source stage combining the outputs of multiple sub-pipelines - the lines are passed as soon as they are produced
+    by any source (the order between the sources is not preserved). The results of the sources are reported
+    as the `result` of the stage in the pipeline result.
+    """
+
+    def __init__(self, sources, queue_size: int):
+        self._sources = [_as_elements(s) for s in sources]
+        self._queue_size = queue_size
+
+    def pipe_attach_to(self, pipeline):
+        # noinspection PyProtectedMember
+        if pipeline._get_left() is not None:
+            raise IllegalStateException('Merge is a source - it makes only sense at the start of pipeline.')
+
+        results: List[Optional[PipelineExecutionResult]] = [None] * len(self._sources)
+        source_pipelines = []
+        for source in self._sources:
+            # noinspection PyProtectedMember
+            source_pipelines.append(pipeline._sub_pipeline().attach_all(*source))
+
+        def merge(lines):
+            writers, reader = _open_queue_batch_channel(writers=len(source_pipelines), **_batching(self._queue_size))
+            threads = [
+                Thread(target=_pump, args=(results, i, p, writers[i]), daemon=True) for i, p in enumerate(source_pipelines)
+            ]
+            for thread in threads:
+                thread.start()
+
+            try:
+                yield from reader.iter_unwrapped()
+
+            finally:
+                # releases the sources blocked on full queue - they stop on the next line
+                reader.close()
+                for thread in threads:
+                    thread.join()
+
+        pipeline.attach_function(merge)
+        # noinspection PyProtectedMember
+        pipeline._set_stage_result(results)
+
+
+def _pump(results: List[Optional[PipelineExecutionResult]], index: int, source_pipeline, writer):
+    stream = source_pipeline.iter_lines()
+    try:
+        for item in stream:
+            writer.write(item)
+    except BrokenPipeError:
+        # the consumer has stopped reading
+        pass
+    finally:
+        results[index] = stream.close()
+        writer.close()
+
+
+def merge(*sources, queue_size: int = 1024) -> Merge:
+    """
+    Creates source stage interleaving the lines produced by multiple sub-pipelines, for example:
+
+        PIPE | merge(['cat', 'a.log'], ('zcat b.log.gz', parse)) | 'sort' | PIPE_END
+
+    The source is single element or tuple of elements (the list is a command).
+
+    :param queue_size: maximal number of lines buffered between the sources and the consumer
+    """
+    return Merge(sources, queue_size)
@@ -0,0 +1,112 @@
+from typing import AnyStr, Callable, Dict, List, Optional
+
+from pyshrimp.exception import IllegalArgumentException
+# noinspection PyProtectedMember
+from pyshrimp.execution_pipeline.pipeline import ExecutionPipeline, _function_kind
+from pyshrimp.execution_pipeline.pipeline_api import PipelineExecutionResult, PipelineTerminator, PipelineTerminatorStdout, \
+    PipelineTerminatorIter, PipelineTerminatorFile
+from pyshrimp.utils.command import cmd, shell_cmd, Command
+
+
+class PipelineArg:
+    """
+    Placeholder for the command argument provided when the template is executed.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return f'PipelineArg({self.name!r})'
+
+
+# compiled element - attaches itself to the pipeline using the execution args
+_CompiledElement = Callable[[ExecutionPipeline, Dict[str, object]], None]
+
+
+class PipelineTemplate:
+    """
+    Pipeline defined once and executed many times. The elements are analyzed when the template is created:
+    the commands given as text / list are created (with their environment), the kinds of the functions are recognized.
+    The list command may contain `PipelineArg` placeholders filled by the arguments of the execution.
+
+    :param options: options of the executed pipelines (see `ExecutionPipeline`)
+    """
+
+    def __init__(self, elements, **options):
+        # validates the options
+        ExecutionPipeline(**options)
+
+        self._options = options
+        self._binary = options.get('binary', False)
+        self._arg_names = set()
+        self._elements: List[_CompiledElement] = [self._compile(el) for el in elements]
+
+    def _compile(self, element) -> _CompiledElement:
+        if isinstance(element, (PipelineTerminator, PipelineTerminatorStdout, PipelineTerminatorIter, PipelineTerminatorFile)):
+            raise IllegalArgumentException('The template must not be terminated - use run() or pipeline() instead.')
+
+        if isinstance(element, str):
+            return self._compile_command(shell_cmd(script=element, check=False, binary=self._binary))
+
+        if isinstance(element, list):
+            placeholders = [el.name for el in element if isinstance(el, PipelineArg)]
+            if not placeholders:
+                return self._compile_command(cmd(command=element, check=False, binary=self._binary))
+
+            self._arg_names.update(placeholders)
+            return lambda pipeline, args: pipeline.attach(
+                cmd(command=[args[el.name] if isinstance(el, PipelineArg) else el for el in element], check=False, binary=self._binary)
+            )
+
+        if isinstance(element, Command):
+            return self._compile_command(element.with_binary() if self._binary and not element.binary else element)
+
+        if any(hasattr(element, attr) for attr in ('pipe_connect_async', 'pipe_connect_sync', 'pipe_attach_to')):
+            return lambda pipeline, args: pipeline.attach(element)
+
+        if callable(element):
+            kind = _function_kind(element)
+            # noinspection PyProtectedMember
+            return lambda pipeline, args: pipeline._attach_function_of_kind(element, kind)
+
+        raise IllegalArgumentException(f'Unsupported pipeline element: {type(element)}')
+
+    @staticmethod
+    def _compile_command(command: Command) -> _CompiledElement:
+        # the same command instance is reused - its environment is built only once
+        return lambda pipeline, args: pipeline.attach(command)
+
+    def pipeline(self, input: Optional[AnyStr] = None, **args) -> ExecutionPipeline:
+        """
+        Creates the pipeline (the processes are started) - it can be terminated as any other pipeline, e.g. with PIPE_ITER.
+
+        :param input: text fed to the first stage
+        :param args: values of the `PipelineArg` placeholders
+        """
+        missing = self._arg_names - args.keys()
+        if missing:
+            raise IllegalArgumentException(f'Missing template args: {", ".join(sorted(missing))}')
+
+        unknown = args.keys() - self._arg_names
+        if unknown:
+            raise IllegalArgumentException(f'Unknown template args: {", ".join(sorted(unknown))}')
+
+        pipeline = ExecutionPipeline(**self._options)
+        if input is not None:
+            pipeline.attach_text(input)
+
+        for element in self._elements:
+            element(pipeline, args)
+
+        return pipeline
+
+    def run(self, input: Optional[AnyStr] = None, timeout: Optional[float] = None, **args) -> PipelineExecutionResult:
+        """
+        Executes the pipeline and returns its result.
+
+        :param input: text fed to the first stage
+        :param timeout: see `ExecutionPipeline.close`
+        :param args: values of the `PipelineArg` placeholders
+        """
+        return self.pipeline(input, **args).close(timeout=timeout)
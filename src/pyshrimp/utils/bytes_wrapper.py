@@ -0,0 +1,7 @@
+from pyshrimp.utils.string_wrapper import StringWrapper
+
+
+class BytesWrapper(bytes):
+
+    def text(self, encoding='utf-8', errors='strict') -> StringWrapper:
+        return StringWrapper(self.decode(encoding, errors))
@@ -1,17 +1,135 @@
 import os
-from typing import Iterable, List, Optional, TextIO, Union, Dict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Union, Dict
 
 # noinspection PyProtectedMember
 from pyshrimp._internal.utils.subprocess_utils import _ExecutingProcess, _spawn_process
+from pyshrimp.exception import IllegalArgumentException
 from pyshrimp.execution_pipeline.pipeline_api import PipelineElement, PipelineExecutionResult
 from pyshrimp.utils.collections import first_not_null
-from pyshrimp.utils.string_wrapper import StringWrapper
+from pyshrimp.utils.command_cache import CommandResultCache
+from pyshrimp.utils.output_capture import CapturePolicy
+# noinspection PyProtectedMember
 from pyshrimp.utils.subprocess_utils import (
+    _wrap_output,
+    BatchedProcessExecutionResult,
+    ProcessBatchExecutionException,
     ProcessExecutionResult,
-    run_process
+    ProcessOutputStream,
+    run_process,
+    run_process_async,
+    stream_process
 )
 
 
+def _environ_state() -> dict:
+    # os.environ keeps the raw data in _data dict - comparing it does not require any copy
+    return getattr(os.environ, '_data', None) or dict(os.environ)
+
+
+# headroom for the data which is hard to predict (auxiliary vector, alignment, ...) - the same as xargs uses
+_ARG_MAX_HEADROOM = 2048
+# the maximal size of single argument on linux (MAX_ARG_STRLEN)
+_MAX_ARG_STRLEN = 32 * 4096
+_POINTER_SIZE = 8
+
+
+def _arg_max() -> int:
+    try:
+        return os.sysconf('SC_ARG_MAX') - _ARG_MAX_HEADROOM
+    except (AttributeError, ValueError, OSError):
+        # no sysconf (e.g. windows) - use the limit of CreateProcess command line
+        return 32767
+
+
+def _args_size(args: Iterable[str]) -> int:
+    return sum(len(el.encode('utf-8')) + 1 + _POINTER_SIZE for el in args)
+
+
+def _env_size(env: Optional[Dict[str, str]]) -> int:
+    env = os.environ if env is None else env
+    return sum(len(k.encode('utf-8')) + len(v.encode('utf-8')) + 2 + _POINTER_SIZE for k, v in env.items())
+
+
+def _items_max_bytes(command: List[str], env: Optional[Dict[str, str]], max_bytes: Optional[int]) -> int:
+    # max_bytes limits the command line (as xargs -s does), the environment is checked against ARG_MAX separately
+    command_size = _args_size(command)
+    command_line_max = _arg_max() - _env_size(env)
+    if command_line_max <= command_size:
+        raise IllegalArgumentException(
+            f'The environment ({_env_size(env)} bytes) leaves no room for the command line '
+            f'within the system limit of arguments size ({_arg_max()} bytes)'
+        )
+
+    if max_bytes is not None:
+        if max_bytes <= command_size:
+            raise IllegalArgumentException(
+                f'The command ({command_size} bytes) leaves no room for the items within max_bytes={max_bytes}'
+            )
+
+        command_line_max = min(command_line_max, max_bytes)
+
+    return command_line_max - command_size
+
+
+def _split_into_batches(items: List[str], max_args: Optional[int], max_bytes: int) -> List[List[str]]:
+    batches = []
+    batch = []
+    batch_size = 0
+
+    for item in items:
+        item_size = _args_size([item])
+        if item_size > max_bytes or item_size > _MAX_ARG_STRLEN:
+            raise IllegalArgumentException(f'Argument is too long to be passed to the command: {item[:100]}...')
+
+        if batch and (batch_size + item_size > max_bytes or (max_args and len(batch) >= max_args)):
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+
+        batch.append(item)
+        batch_size += item_size
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def _run_concurrently(fn: Callable, items: Iterable, max_workers: int, ordered: bool) -> Iterator:
+    # keep the queue of submitted executions bounded so huge (or lazy) items are not materialized
+    max_pending = max_workers * 2
+    items_iter = iter(items)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                for item in items_iter:
+                    pending.append(executor.submit(fn, item))
+                    if len(pending) >= max_pending:
+                        break
+
+                if not pending:
+                    break
+
+                if ordered:
+                    completed = [pending.popleft()]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    completed = [f for f in pending if f in done]
+                    for f in completed:
+                        pending.remove(f)
+
+                for f in completed:
+                    yield f.result()
+
+        finally:
+            for f in pending:
+                f.cancel()
+
+
 class SkipConfig:
 
     def __init__(
@@ -67,15 +185,40 @@ class _CommandPipelineElement(PipelineElement):
         self._command = command
         self._result: Optional[ProcessExecutionResult] = None
         self._stdout = self._executing_command.stdout
+        self._stdout_detached = False
 
     def _close_once(self):
+        if self._stdout_detached and self._stdout is not None:
+            # the consumer is done - the process still writing should get SIGPIPE instead of blocking forever
+            self._stdout.close()
+
         self._result = self._executing_command.close()
-        self._stdout.close()
+        if self._stdout is not None:
+            self._stdout.close()
 
     def stdout_for_pipe(self):
         self._executing_command.detach_stdout()
+        self._stdout_detached = True
         return self._stdout
 
+    def on_stdout_passed_to_process(self):
+        self._stdout.close()
+
+    def cancel(self):
+        self._executing_command.kill()
+
+    def result_after_cancel(self, timeout: float) -> Optional[PipelineExecutionResult]:
+        process_result = self._result or self._executing_command.result_if_finished(timeout)
+        if process_result is None:
+            return None
+
+        return PipelineExecutionResult(
+            stdout=process_result.standard_output,
+            stderr=process_result.error_output,
+            result=process_result,
+            exception=process_result.exception
+        )
+
     @property
     def result(self) -> PipelineExecutionResult:
         return PipelineExecutionResult(
@@ -95,8 +238,17 @@ class Command:
         argument_processor: CommandArgProcessor = None,
         env: Dict[str, str] = None,
         env_append: bool = True,
-        cwd: Optional[str] = None
+        cwd: Optional[str] = None,
+        binary: bool = False,
+        fast_spawn: bool = False,
+        cache: Optional[CommandResultCache] = None,
+        capture_policy: Optional[CapturePolicy] = None
     ):
+        """
+        :param cache: when provided the results of executions are cached - should be used only with idempotent
+                      (read-only) commands
+        :param capture_policy: when provided the captured outputs exceeding the memory limit are spilled to disk
+        """
         self._env = env
         self._env_append = env_append
         self._check = check
@@ -105,6 +257,16 @@ class Command:
         # by-design we do not use argument processor this list - just cast everything to string to ensure we won't blow up
         self._command = [str(el) for el in command]
         self._cwd = cwd
+        self._binary = binary
+        self._fast_spawn = fast_spawn
+        self._cache = cache
+        self._capture_policy = capture_policy
+        self._env_cache = None
+        self._env_cache_source = None
+
+    @property
+    def binary(self) -> bool:
+        return self._binary
 
     def __call__(self, *args, **kwargs):
         return self.exec(*args, **kwargs)
@@ -119,57 +281,310 @@ class Command:
 
         command = self._build_command(args)
 
-        if isinstance(skip, bool):
-            skip = SkipConfig(skip=skip)
+        skipped_result = self._skipped_result(command, args, skip)
+        if skipped_result:
+            return skipped_result
+
+        res = self._run(command, cmd_in, capture, cwd)
+
+        if first_not_null(check, self._check):
+            res.raise_if_not_ok()
+
+        return res
 
-        if skip.should_skip(args):
-            return ProcessExecutionResult(
+    def _run(self, command: List[str], cmd_in, capture: Optional[bool], cwd: Optional[str]) -> ProcessExecutionResult:
+        _capture = first_not_null(capture, self._capture)
+        _cwd = first_not_null(cwd, self._cwd)
+
+        cache_key = self._cache_key(command, cmd_in, _capture, _cwd) if self._cache else None
+        res = self._cache.get(cache_key) if self._cache else None
+
+        if res is None:
+            res = run_process(
                 command=command,
-                standard_output=StringWrapper(skip.skipped_out),
-                error_output=StringWrapper(skip.skipped_err),
-                return_code=skip.skipped_code
+                capture_out=_capture,
+                capture_err=_capture,
+                cmd_in=cmd_in,
+                env=self._build_env(),
+                cwd=_cwd,
+                binary=self._binary,
+                fast_spawn=self._fast_spawn,
+                capture_policy=self._capture_policy
             )
 
+            if self._cache and res.exception is None:
+                self._cache.put(cache_key, res)
+
+        return res
+
+    async def exec_async(
+        self, *args, cmd_in=None,
+        check: Optional[bool] = None,
+        capture: Optional[bool] = None,
+        skip: Union[bool, SkipConfig] = False,
+        cwd: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> ProcessExecutionResult:
+        """
+        Asynchronous version of `exec` - the process is executed using asyncio so many commands can be awaited
+        concurrently from single event loop. The cache and the capture policy of the command are used as by `exec`.
+        """
+        command = self._build_command(args)
+
+        skipped_result = self._skipped_result(command, args, skip)
+        if skipped_result:
+            return skipped_result
+
         _capture = first_not_null(capture, self._capture)
+        _cwd = first_not_null(cwd, self._cwd)
 
-        res = run_process(
-            command=command,
-            capture_out=_capture,
-            capture_err=_capture,
-            cmd_in=cmd_in,
-            env=self._build_env(),
-            cwd=first_not_null(cwd, self._cwd)
+        cache_key = self._cache_key(command, cmd_in, _capture, _cwd) if self._cache else None
+        res = self._cache.get(cache_key) if self._cache else None
+
+        if res is None:
+            res = await run_process_async(
+                command=command,
+                timeout=timeout,
+                capture_out=_capture,
+                capture_err=_capture,
+                cmd_in=cmd_in,
+                env=self._build_env(),
+                cwd=_cwd,
+                binary=self._binary,
+                capture_policy=self._capture_policy
+            )
+
+            if self._cache and res.exception is None:
+                self._cache.put(cache_key, res)
+
+        if first_not_null(check, self._check):
+            res.raise_if_not_ok()
+
+        return res
+
+    def map(
+        self, arg_sets: Iterable,
+        max_workers: int = 10,
+        ordered: bool = True,
+        cmd_in=None,
+        check: Optional[bool] = None,
+        capture: Optional[bool] = None,
+        cwd: Optional[str] = None
+    ) -> Iterator[ProcessExecutionResult]:
+        """
+        Executes the command for each of the argument sets concurrently, running at most `max_workers` processes
+        at once.
+
+        Yields the results in order of `arg_sets` (or as they complete when `ordered` is false).
+        When check is enabled the failures do not stop the batch - all failed results are reported
+        with `ProcessBatchExecutionException` once all executions complete.
+
+        :param arg_sets: iterable of arguments - each element is either single argument or list/tuple of arguments
+        """
+        _check = first_not_null(check, self._check)
+        failed_results = []
+
+        def _exec(arg_set):
+            args = arg_set if isinstance(arg_set, (list, tuple)) else (arg_set,)
+            return self.exec(*args, cmd_in=cmd_in, check=False, capture=capture, cwd=cwd)
+
+        for res in _run_concurrently(_exec, arg_sets, max_workers=max_workers, ordered=ordered):
+            if not res.is_ok():
+                failed_results.append(res)
+
+            yield res
+
+        if _check and failed_results:
+            raise ProcessBatchExecutionException(
+                message=f'Command execution failed for {len(failed_results)} argument set(s)',
+                failed_results=failed_results
+            )
+
+    def exec_batched(
+        self, *args, items: Iterable,
+        max_args: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        parallel: int = 1,
+        cmd_in=None,
+        check: Optional[bool] = None,
+        capture: Optional[bool] = None,
+        skip: Union[bool, SkipConfig] = False,
+        cwd: Optional[str] = None
+    ) -> BatchedProcessExecutionResult:
+        """
+        Executes the command with `args` followed by the `items` - just like xargs the items are split into
+        batches so each execution fits into the system limit of arguments size (ARG_MAX).
+
+        The batches are executed concurrently (up to `parallel` at once) and the results are merged into
+        single result (outputs are concatenated in order of batches, the return code is the first non-zero one).
+
+        :param max_args: maximum number of items per execution
+        :param max_bytes: maximum size of the command line (the environment is not included, as with `xargs -s`),
+                          defaults to what fits into ARG_MAX next to the environment
+        """
+        command = self._build_command(args)
+        processed_items = self._argument_processor.process_args(*items)
+
+        skipped_result = self._skipped_result(command, processed_items, skip)
+        if skipped_result:
+            return BatchedProcessExecutionResult.merge(
+                command, [skipped_result], binary=self._binary, capture_policy=self._capture_policy
+            )
+
+        batches = _split_into_batches(
+            processed_items,
+            max_args=max_args,
+            max_bytes=_items_max_bytes(command, self._build_env(), max_bytes)
+        )
+
+        batch_results = list(
+            _run_concurrently(
+                lambda batch: self._run(command + batch, cmd_in, capture, cwd), batches, max_workers=parallel, ordered=True
+            )
         )
 
+        res = BatchedProcessExecutionResult.merge(
+            command, batch_results, binary=self._binary, capture_policy=self._capture_policy
+        )
         if first_not_null(check, self._check):
             res.raise_if_not_ok()
 
         return res
 
-    def _build_env(self):
-        env = os.environ.copy() if self._env_append else {}
-        env.update(self._env or {})
-        return env
+    def _cache_key(self, command, cmd_in, capture, cwd):
+        return (
+            tuple(command),
+            cwd,
+            tuple(sorted((self._env or {}).items())),
+            self._env_append,
+            cmd_in,
+            capture,
+            self._binary
+        )
+
+    def invalidate_cache(self, *args, cmd_in=None, capture: Optional[bool] = None, cwd: Optional[str] = None):
+        """
+        Removes cached result of execution with given arguments.
+        """
+        if self._cache:
+            self._cache.invalidate(
+                self._cache_key(
+                    self._build_command(args), cmd_in, first_not_null(capture, self._capture), first_not_null(cwd, self._cwd)
+                )
+            )
+
+    def _skipped_result(self, command, args, skip: Union[bool, SkipConfig]) -> Optional[ProcessExecutionResult]:
+        if isinstance(skip, bool):
+            skip = SkipConfig(skip=skip)
+
+        if not skip.should_skip(args):
+            return None
+
+        return ProcessExecutionResult(
+            command=command,
+            standard_output=_wrap_output(self._as_output_data(skip.skipped_out), self._binary),
+            error_output=_wrap_output(self._as_output_data(skip.skipped_err), self._binary),
+            return_code=skip.skipped_code
+        )
+
+    def _as_output_data(self, text: str):
+        return text.encode('utf-8') if self._binary else text
+
+    def stream(
+        self, *args, cmd_in=None,
+        check: Optional[bool] = None,
+        capture: Optional[bool] = None,
+        cwd: Optional[str] = None,
+        chunk_size: Optional[int] = None
+    ) -> ProcessOutputStream:
+        """
+        Executes the command and streams the standard output as it is produced.
+
+        Yields lines (or chunks of `chunk_size` characters) of the output. The check is performed after the stream
+        is exhausted. The error output is captured separately and is available in the `result` of the stream.
+        """
+        return stream_process(
+            command=self._build_command(args),
+            cmd_in=cmd_in,
+            capture_err=first_not_null(capture, self._capture),
+            env=self._build_env(),
+            cwd=first_not_null(cwd, self._cwd),
+            check=first_not_null(check, self._check),
+            chunk_size=chunk_size,
+            binary=self._binary,
+            fast_spawn=self._fast_spawn
+        )
+
+    def _build_env(self) -> Optional[Dict[str, str]]:
+        if self._env_append and not self._env:
+            # nothing to override - the process simply inherits the environment
+            return None
+
+        if not self._env_append:
+            if self._env_cache is None:
+                self._env_cache = dict(self._env or {})
+
+            return self._env_cache
+
+        # the merged env is re-built only when the os.environ changes
+        environ_state = _environ_state()
+        if self._env_cache is None or self._env_cache_source != environ_state:
+            env = os.environ.copy()
+            env.update(self._env)
+            self._env_cache = env
+            self._env_cache_source = environ_state.copy()
+
+        return self._env_cache
 
     def with_args(self, *args):
-        return Command(
-            command=self._build_command(args=args),
+        return self._copy(command=self._build_command(args=args))
+
+    def with_binary(self, binary: bool = True):
+        return self._copy(binary=binary)
+
+    def with_cache(self, cache: Optional[CommandResultCache]):
+        return self._copy(cache=cache)
+
+    def with_capture_policy(self, capture_policy: Optional[CapturePolicy]):
+        return self._copy(capture_policy=capture_policy)
+
+    def _copy(self, **overrides):
+        params = dict(
+            command=self._command,
             check=self._check,
             capture=self._capture,
             argument_processor=self._argument_processor,
             env=self._env,
             env_append=self._env_append,
             cwd=self._cwd,
+            binary=self._binary,
+            fast_spawn=self._fast_spawn,
+            cache=self._cache,
+            capture_policy=self._capture_policy,
         )
+        params.update(overrides)
+        return Command(**params)
 
     def __str__(self):
         return f'Command({self.__dict__})'
 
+    def _display_name(self) -> str:
+        # shell_cmd wraps the script with bash - the script itself is more readable
+        if self._command[:2] == ['/bin/bash', '-c']:
+            return self._command[2]
+
+        return ' '.join(self._command)
+
     def _build_command(self, args=None):
         command_args = self._argument_processor.process_args(*(args or []))
         return self._command + command_args
 
-    def pipe_connect_async(self, left_out: TextIO) -> _CommandPipelineElement:
+    def pipe_connect_async(self, left_out: TextIO, stderr_tail_bytes: Optional[int] = None, process_group=False) -> _CommandPipelineElement:
+        """
+        :param stderr_tail_bytes: when set only the last bytes of the error output are kept
+        :param process_group: when set the process is started in its own process group - the cancelled pipeline kills
+                              the whole group (including the children of the command)
+        """
         return _CommandPipelineElement(
             command=self,
             executing_command=_spawn_process(
@@ -178,7 +593,11 @@ class Command:
                 env=self._build_env(),
                 capture_output=self._capture,
                 capture_err_output=self._capture,
-                cwd=self._cwd
+                cwd=self._cwd,
+                binary=self._binary,
+                fast_spawn=self._fast_spawn,
+                err_tail_bytes=stderr_tail_bytes,
+                process_group=process_group
                 # TODO: other params like check
             )
         )
@@ -189,12 +608,16 @@ class Command:
             env=self._build_env(),
             capture_output=self._capture,
             capture_err_output=self._capture,
-            cwd=self._cwd
+            cwd=self._cwd,
+            binary=self._binary,
+            fast_spawn=self._fast_spawn
             # TODO: other params like check
         )
 
 
-def cmd(command: Union[str, List], *args, check=True, capture=True, env: Dict[str, str] = None, env_append=True, cwd: str = None) -> Command:
+def cmd(command: Union[str, List], *args, check=True, capture=True, env: Dict[str, str] = None, env_append=True, cwd: str = None,
+        binary=False, fast_spawn=False, cache_ttl: Optional[float] = None,
+        capture_policy: Optional[CapturePolicy] = None) -> Command:
     if isinstance(command, str):
         command = [command]
 
@@ -204,16 +627,26 @@ def cmd(command: Union[str, List], *args, check=True, capture=True, env: Dict[st
         capture=capture,
         env=env,
         env_append=env_append,
-        cwd=cwd
+        cwd=cwd,
+        binary=binary,
+        fast_spawn=fast_spawn,
+        cache=CommandResultCache(ttl_sec=cache_ttl) if cache_ttl is not None else None,
+        capture_policy=capture_policy
     )
 
 
-def shell_cmd(script: str, *args: str, check=True, capture=True, env: Dict[str, str] = None, env_append=True, cwd: str = None) -> Command:
+def shell_cmd(script: str, *args: str, check=True, capture=True, env: Dict[str, str] = None, env_append=True, cwd: str = None,
+              binary=False, fast_spawn=False, cache_ttl: Optional[float] = None,
+              capture_policy: Optional[CapturePolicy] = None) -> Command:
     return Command(
         command=['/bin/bash', '-c', script, 'bash'] + [str(el) for el in args],
         check=check,
         capture=capture,
         env=env,
         env_append=env_append,
-        cwd=cwd
+        cwd=cwd,
+        binary=binary,
+        fast_spawn=fast_spawn,
+        cache=CommandResultCache(ttl_sec=cache_ttl) if cache_ttl is not None else None,
+        capture_policy=capture_policy
     )
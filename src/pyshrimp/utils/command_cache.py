@@ -0,0 +1,140 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+# noinspection PyProtectedMember
+from pyshrimp._internal.utils.cache_dir import _pyshrimp_cache_dir
+# noinspection PyProtectedMember
+from pyshrimp.utils.subprocess_utils import ProcessExecutionResult, _wrap_output
+
+
+def _encode_output(data, binary):
+    return base64.b64encode(data).decode('ascii') if binary else str(data)
+
+
+def _decode_output(data, binary):
+    return _wrap_output(base64.b64decode(data) if binary else data, binary)
+
+
+class CommandResultCache:
+    """
+    Caches the results of command executions for `ttl_sec` seconds.
+
+    The cache keeps at most `max_entries` results in memory (the least recently used are evicted first).
+    When `persist` is set the results are also stored on disk (under `PYSHRIMP_CACHE_DIR`, or the `persist_dir`)
+    so they survive the script restarts (e.g. devloop re-runs).
+    """
+
+    def __init__(self, ttl_sec: float, max_entries: int = 128, persist=False, persist_dir: Optional[str] = None):
+        self._ttl_sec = ttl_sec
+        self._max_entries = max_entries
+        self._persist_dir = (persist_dir or _pyshrimp_cache_dir('command_results')) if persist else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[ProcessExecutionResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    return result
+
+                del self._entries[key]
+
+        if self._persist_dir:
+            result = self._load(key)
+            if result is not None:
+                return result
+
+        return None
+
+    def put(self, key: Hashable, result: ProcessExecutionResult):
+        expires_at = time.time() + self._ttl_sec
+        self._remember(key, expires_at, result)
+
+        if self._persist_dir:
+            self._store(key, expires_at, result)
+
+    def _remember(self, key: Hashable, expires_at: float, result: ProcessExecutionResult):
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """
+        Removes the given entry from the cache. Removes all entries when key is not provided.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+        if self._persist_dir and os.path.isdir(self._persist_dir):
+            file_names = [self._file_name(key)] if key is not None else os.listdir(self._persist_dir)
+            for file_name in file_names:
+                try:
+                    os.remove(os.path.join(self._persist_dir, file_name))
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def _file_name(key: Hashable) -> str:
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.json'
+
+    def _store(self, key: Hashable, expires_at: float, result: ProcessExecutionResult):
+        binary = isinstance(result.standard_output, bytes)
+        os.makedirs(self._persist_dir, exist_ok=True)
+        file_path = os.path.join(self._persist_dir, self._file_name(key))
+
+        # write to temporary file first so concurrent readers never see partial entry
+        tmp_file_path = f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_file_path, 'w', encoding='utf-8') as f:
+            json.dump(
+                {
+                    'key': repr(key),
+                    'expires_at': expires_at,
+                    'command': result.command if isinstance(result.command, str) else list(result.command),
+                    'binary': binary,
+                    'standard_output': _encode_output(result.standard_output, binary),
+                    'error_output': _encode_output(result.error_output, binary),
+                    'return_code': result.return_code
+                },
+                f
+            )
+
+        os.replace(tmp_file_path, file_path)
+
+    def _load(self, key: Hashable) -> Optional[ProcessExecutionResult]:
+        file_path = os.path.join(self._persist_dir, self._file_name(key))
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if data['key'] != repr(key):
+            return None
+
+        if data['expires_at'] <= time.time():
+            self.invalidate(key)
+            return None
+
+        result = ProcessExecutionResult(
+            command=data['command'],
+            standard_output=_decode_output(data['standard_output'], data['binary']),
+            error_output=_decode_output(data['error_output'], data['binary']),
+            return_code=data['return_code']
+        )
+
+        self._remember(key, data['expires_at'], result)
+        return result
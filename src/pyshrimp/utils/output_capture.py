@@ -0,0 +1,198 @@
+import io
+import locale
+import mmap
+import os
+import tempfile
+from typing import Optional, Union, List, Iterator
+
+# noinspection PyProtectedMember
+from pyshrimp._internal.utils.cache_dir import _pyshrimp_cache_dir
+from pyshrimp.utils.splitter import Splitter, default_splitter
+# noinspection PyProtectedMember
+from pyshrimp.utils.string_wrapper import StringWrapper, _iter_match_lines, _iter_match_lines_multi_group, _iter_columns
+from pyshrimp.utils.table_parser import parse_table, ParsedTable
+
+
+def _decode_text_output(data: Optional[bytes], encoding: Optional[str] = None, errors: Optional[str] = None) -> str:
+    # mimic the universal_newlines behavior of subprocess
+    if not data:
+        return ''
+
+    return io.TextIOWrapper(io.BytesIO(data), encoding=encoding or locale.getpreferredencoding(False), errors=errors).read()
+
+
+class CapturePolicy:
+    """
+    Describes how the process output is captured.
+
+    Up to `max_memory_bytes` of each output is kept in memory, bigger outputs are spilled to temporary file
+    (created in `spill_dir`, by default in the PyShrimp cache directory) and exposed with `SpilledOutput`.
+    """
+
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024, spill_dir: Optional[str] = None):
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+
+    def get_spill_dir(self) -> str:
+        return self.spill_dir or _pyshrimp_cache_dir('spilled_output')
+
+
+class _MmapReader(io.RawIOBase):
+    """
+    Reads the mapped file without changing the position of the file (many readers may be open at once).
+    """
+
+    def __init__(self, data: mmap.mmap):
+        super().__init__()
+        self._data = data
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._data[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
+class SpilledOutput:
+    """
+    Process output stored in file instead of memory.
+
+    The file is mapped into memory (mmap) and the parsing methods known from `StringWrapper` process it lazily
+    - they return iterators instead of lists. The file is removed from the disk right after creation,
+    the data is released when the object is closed (or garbage collected).
+    """
+
+    def __init__(self, file, binary=False, encoding: Optional[str] = None):
+        """
+        :param encoding: encoding of the text output (by default the locale encoding - same as the output kept in memory)
+        """
+        self._file = file
+        self._binary = binary
+        self._encoding = encoding or locale.getpreferredencoding(False)
+        self._mmap = None
+        self._size = os.fstat(file.fileno()).st_size
+        self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+        self._file.close()
+
+    def __del__(self):
+        self.close()
+
+    def data(self) -> bytes:
+        return self._mmap[:] if self._mmap is not None else b''
+
+    def write_to(self, file, chunk_size=1024 * 1024):
+        """
+        Writes the data to the file-like object in chunks - the data is not loaded into memory at once.
+        """
+        for pos in range(0, self._size, chunk_size):
+            file.write(self._mmap[pos:pos + chunk_size])
+
+    def text(self) -> StringWrapper:
+        return StringWrapper(_decode_text_output(self.data(), self._encoding))
+
+    def __str__(self):
+        return self.text()
+
+    def __repr__(self):
+        return f'SpilledOutput(size={self._size})'
+
+    def _iter_raw_lines(self) -> Iterator[bytes]:
+        if self._mmap is None:
+            return
+
+        pos = 0
+        while pos < self._size:
+            end = self._mmap.find(b'\n', pos)
+            if end < 0:
+                end = self._size
+
+            yield self._mmap[pos:end].rstrip(b'\r')
+            pos = end + 1
+
+    def _iter_text_lines(self) -> Iterator[str]:
+        if self._mmap is None:
+            return
+
+        # decoded with universal newlines and split as the output kept in memory (`str.splitlines`)
+        text = io.TextIOWrapper(io.BufferedReader(_MmapReader(self._mmap)), encoding=self._encoding)
+        for line in text:
+            yield from line.splitlines()
+
+    def lines(self, include_empty=False) -> Iterator[Union[str, bytes]]:
+        for line in self._iter_raw_lines() if self._binary else self._iter_text_lines():
+            if line or include_empty:
+                yield line
+
+    def match_lines(self, pattern, capture_group: Union[str, int] = 1, include_empty_lines=False) -> Iterator[Union[str, None]]:
+        return _iter_match_lines(self.lines(include_empty_lines), pattern, capture_group)
+
+    def match_lines_multi_group(self, pattern, capture_groups: List[Union[str, int]], include_empty_lines=False) -> Iterator[List[Union[str, None]]]:
+        return _iter_match_lines_multi_group(self.lines(include_empty_lines), pattern, capture_groups)
+
+    def columns(self, *column_index, splitter: Splitter = default_splitter, maxsplit=0) -> Iterator[List[Union[str, None]]]:
+        return _iter_columns(self.lines(include_empty=False), column_index, splitter, maxsplit)
+
+    def parse_table(self, splitter: Splitter = default_splitter) -> ParsedTable:
+        return parse_table(self.lines(include_empty=False), splitter)
+
+
+class _SpillingBuffer:
+
+    def __init__(self, policy: CapturePolicy):
+        self._policy = policy
+        self._chunks = []
+        self._size = 0
+        self._file = None
+
+    def write(self, chunk: bytes):
+        if self._file is not None:
+            self._file.write(chunk)
+            return
+
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self._size > self._policy.max_memory_bytes:
+            self._spill()
+
+    def _spill(self):
+        spill_dir = self._policy.get_spill_dir()
+        os.makedirs(spill_dir, exist_ok=True)
+        # the file is not needed on disk once opened - the data is accessible via descriptor until closed
+        self._file = tempfile.TemporaryFile(dir=spill_dir, prefix='output_')
+        for chunk in self._chunks:
+            self._file.write(chunk)
+
+        self._chunks = []
+
+    def collect(self, binary: bool) -> Union[bytes, SpilledOutput]:
+        if self._file is None:
+            return b''.join(self._chunks)
+
+        self._file.flush()
+        return SpilledOutput(self._file, binary=binary)
+
+    def read_from(self, stream, chunk_size=65536):
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            self.write(chunk)
+
+        stream.close()
@@ -0,0 +1,131 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Optional, List, Dict
+
+
+@dataclass
+class ProcessResourceUsage:
+    wall_time_sec: float
+    user_cpu_sec: Optional[float] = None
+    system_cpu_sec: Optional[float] = None
+    max_rss_bytes: Optional[int] = None
+    voluntary_context_switches: Optional[int] = None
+    involuntary_context_switches: Optional[int] = None
+
+
+ExecutionListener = Callable[['ProcessExecutionResult'], None]
+
+_execution_listeners: List[ExecutionListener] = []
+_execution_listeners_lock = threading.Lock()
+_log = logging.getLogger()
+
+
+def add_execution_listener(listener: ExecutionListener):
+    """
+    Registers function which will be called with result of every process execution.
+    """
+    with _execution_listeners_lock:
+        _execution_listeners.append(listener)
+
+
+def remove_execution_listener(listener: ExecutionListener):
+    with _execution_listeners_lock:
+        if listener in _execution_listeners:
+            _execution_listeners.remove(listener)
+
+
+def _notify_execution_listeners(result):
+    for listener in list(_execution_listeners):
+        try:
+            listener(result)
+        except Exception:
+            # the listener must not change the outcome of the execution
+            _log.exception(f'Execution listener {listener} failed')
+
+    return result
+
+
+@dataclass
+class ResourceUsageSummary:
+    key: str
+    executions: int = 0
+    wall_time_sec: float = 0.0
+    user_cpu_sec: float = 0.0
+    system_cpu_sec: float = 0.0
+    max_rss_bytes: int = 0
+    context_switches: int = 0
+    return_codes: Dict[int, int] = field(default_factory=dict)
+
+    def add(self, usage: ProcessResourceUsage, return_code: int):
+        self.executions += 1
+        self.wall_time_sec += usage.wall_time_sec
+        self.user_cpu_sec += usage.user_cpu_sec or 0.0
+        self.system_cpu_sec += usage.system_cpu_sec or 0.0
+        self.max_rss_bytes = max(self.max_rss_bytes, usage.max_rss_bytes or 0)
+        self.context_switches += (usage.voluntary_context_switches or 0) + (usage.involuntary_context_switches or 0)
+        self.return_codes[return_code] = self.return_codes.get(return_code, 0) + 1
+
+
+def _default_summary_key(result) -> str:
+    command = result.command
+    return command if isinstance(command, str) else ' '.join(str(el) for el in command)
+
+
+class ResourceUsageCollector:
+    """
+    Aggregates resource usage of executed processes. Use as context manager to collect the executions
+    performed within the block:
+
+        with ResourceUsageCollector() as collector:
+            ...
+        print(collector.report())
+    """
+
+    def __init__(self, key: Callable[['ProcessExecutionResult'], str] = _default_summary_key):
+        self._key = key
+        self._summaries: Dict[str, ResourceUsageSummary] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, result):
+        if result.resource_usage is None:
+            return
+
+        key = self._key(result)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = ResourceUsageSummary(key=key)
+
+            summary.add(result.resource_usage, result.return_code)
+
+    def start(self):
+        add_execution_listener(self)
+        return self
+
+    def stop(self):
+        remove_execution_listener(self)
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def summaries(self) -> List[ResourceUsageSummary]:
+        """
+        Returns the summaries ordered by total wall time (the most expensive first).
+        """
+        with self._lock:
+            return sorted(self._summaries.values(), key=lambda s: s.wall_time_sec, reverse=True)
+
+    def report(self, top: int = 10) -> str:
+        lines = [f'{"count":>7} {"wall [s]":>10} {"user [s]":>10} {"sys [s]":>10} {"max rss [MB]":>13}  command']
+        for s in self.summaries()[:top]:
+            lines.append(
+                f'{s.executions:>7} {s.wall_time_sec:>10.3f} {s.user_cpu_sec:>10.3f} {s.system_cpu_sec:>10.3f}'
+                f' {s.max_rss_bytes / (1024 * 1024):>13.1f}  {s.key}'
+            )
+
+        return '\n'.join(lines)
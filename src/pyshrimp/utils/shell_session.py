@@ -0,0 +1,186 @@
+import os
+import re
+import selectors
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+# noinspection PyProtectedMember
+from pyshrimp._internal.utils.process_spawning import _popen
+from pyshrimp.utils.collections import first_not_null
+# noinspection PyProtectedMember
+from pyshrimp.utils.output_capture import _decode_text_output
+# noinspection PyProtectedMember
+from pyshrimp.utils.resource_usage import ProcessResourceUsage, _notify_execution_listeners
+from pyshrimp.utils.string_wrapper import StringWrapper
+from pyshrimp.utils.subprocess_utils import ProcessExecutionResult
+
+
+class ShellSession:
+    """
+    Long-lived bash process executing scripts one by one.
+
+    Running snippets in single bash process removes the cost of starting new shell for each of them.
+    The shell state (variables, current directory, functions) is kept between the `run` calls unless
+    the session is reset (explicitly with `reset` or automatically when `reset_each_call` is set).
+
+    The script output is separated from the protocol data using random markers written after script completion:
+    the stdout ends with `\\n<marker> <exit code>\\n` and the stderr ends with `\\n<marker>\\n`.
+    The scripts are executed with stdin redirected from /dev/null. The execution listeners are notified about each
+    script - only the wall time of the script is known (the shell process is not reaped after each script).
+    """
+
+    def __init__(self, check=True, env: Dict[str, str] = None, env_append=True, cwd: Optional[str] = None,
+                 reset_each_call=False, shell='/bin/bash'):
+        self._check = check
+        self._env = env
+        self._env_append = env_append
+        self._cwd = cwd
+        self._reset_each_call = reset_each_call
+        self._shell = shell
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def run(self, script: str, *args, check: Optional[bool] = None) -> ProcessExecutionResult:
+        with self._lock:
+            if self._reset_each_call:
+                self._stop()
+
+            res = self._run(script, [str(el) for el in args])
+
+        if first_not_null(check, self._check):
+            res.raise_if_not_ok()
+
+        return res
+
+    def __call__(self, script: str, *args, check: Optional[bool] = None) -> ProcessExecutionResult:
+        return self.run(script, *args, check=check)
+
+    def reset(self):
+        """
+        Drops the shell state - the next script will be executed by fresh shell process.
+        """
+        with self._lock:
+            self._stop()
+
+    def close(self):
+        self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _start(self) -> subprocess.Popen:
+        env = None
+        if self._env or not self._env_append:
+            env = os.environ.copy() if self._env_append else {}
+            env.update(self._env or {})
+
+        return _popen(
+            [self._shell],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self._cwd,
+            env=env
+        )
+
+    def _stop(self):
+        if self._process is None:
+            return
+
+        p = self._process
+        self._process = None
+        if p.poll() is None:
+            p.stdin.close()
+            p.kill()
+
+        p.wait()
+        p.stdout.close()
+        p.stderr.close()
+
+    def _run(self, script: str, args) -> ProcessExecutionResult:
+        started_at = time.perf_counter()
+        if self._process is None:
+            self._process = self._start()
+
+        marker = f'__pyshrimp_{uuid.uuid4().hex}'
+        framed_script = (
+            f"IFS= read -r -d '' __pyshrimp_script <<'{marker}'\n"
+            f"{script}\n"
+            f"{marker}\n"
+            f"set -- {' '.join(shlex.quote(el) for el in args)}\n"
+            f'eval "$__pyshrimp_script" </dev/null\n'
+            f'__pyshrimp_rc=$?\n'
+            f"printf '\\n%s %d\\n' '{marker}' \"$__pyshrimp_rc\"\n"
+            f"printf '\\n%s\\n' '{marker}' >&2\n"
+        )
+
+        try:
+            self._process.stdin.write(framed_script.encode('utf-8'))
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            # the shell is gone (most likely exited in the previous script) - the outputs will be empty
+            pass
+
+        out, err, return_code = self._read_results(marker)
+        return _notify_execution_listeners(ProcessExecutionResult(
+            command=script,
+            standard_output=StringWrapper(_decode_text_output(out)),
+            error_output=StringWrapper(_decode_text_output(err)),
+            return_code=return_code,
+            resource_usage=ProcessResourceUsage(wall_time_sec=time.perf_counter() - started_at)
+        ))
+
+    def _read_results(self, marker: str):
+        out_end = re.compile(rb'\n' + marker.encode('ascii') + rb' (\d+)\n$')
+        err_end = b'\n' + marker.encode('ascii') + b'\n'
+        out_tail_len = len(marker) + 16
+        out = bytearray()
+        err = bytearray()
+        return_code = None
+        err_done = False
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._process.stdout, selectors.EVENT_READ, out)
+            selector.register(self._process.stderr, selectors.EVENT_READ, err)
+
+            while return_code is None or not err_done:
+                events = selector.select()
+                if not events:
+                    continue
+
+                for key, _ in events:
+                    chunk = os.read(key.fileobj.fileno(), 65536)
+                    if not chunk:
+                        # shell exited (e.g. the script called exit)
+                        selector.unregister(key.fileobj)
+                        if not selector.get_map():
+                            self._process.wait()
+                            rc = self._process.returncode
+                            self._stop()
+                            return bytes(out), bytes(err), rc
+                        continue
+
+                    key.data.extend(chunk)
+
+                # only the tail can contain the marker
+                m = out_end.search(out, max(0, len(out) - out_tail_len)) if return_code is None else None
+                if m:
+                    return_code = int(m.group(1))
+                    del out[m.start():]
+
+                if not err_done and err.endswith(err_end):
+                    err_done = True
+                    del err[-len(err_end):]
+
+        return bytes(out), bytes(err), return_code
+
+
+def shell_session(check=True, env: Dict[str, str] = None, env_append=True, cwd: str = None, reset_each_call=False) -> ShellSession:
+    return ShellSession(check=check, env=env, env_append=env_append, cwd=cwd, reset_each_call=reset_each_call)
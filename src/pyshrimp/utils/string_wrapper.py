@@ -1,10 +1,43 @@
 import re
-from typing import Union, List
+from typing import Union, List, Iterable, Iterator
 
 from pyshrimp.utils.splitter import Splitter, default_splitter
 from pyshrimp.utils.table_parser import parse_table
 
 
+def _iter_match_lines(lines: Iterable[str], pattern, capture_group: Union[str, int]) -> Iterator[Union[str, None]]:
+    match_list = (
+        re.match(pattern, el) for el in lines
+    )
+    return (
+        m.group(capture_group) for m in match_list if m
+    )
+
+
+def _iter_match_lines_multi_group(lines: Iterable[str], pattern, capture_groups: List[Union[str, int]]) -> Iterator[List[Union[str, None]]]:
+    match_list = (
+        re.match(pattern, el) for el in lines
+    )
+    return (
+        [
+            m.group(g) for g in capture_groups
+        ] for m in match_list if m
+    )
+
+
+def _iter_columns(lines: Iterable[str], column_index, splitter: Splitter, maxsplit) -> Iterator[List[Union[str, None]]]:
+    def _process_line(line):
+        split_line = splitter(line, maxsplit=maxsplit)
+        if not column_index:
+            return split_line
+        else:
+            return [(split_line[i:i + 1] or [None])[0] for i in column_index]
+
+    return (
+        _process_line(line) for line in lines
+    )
+
+
 class StringWrapper(str):
 
     def lines(self, include_empty=False):
@@ -15,34 +48,13 @@ class StringWrapper(str):
             return [line for line in all_lines if line]
 
     def match_lines(self, pattern, capture_group: Union[str, int] = 1, include_empty_lines=False) -> List[Union[str, None]]:
-        match_list = (
-            re.match(pattern, el) for el in self.lines(include_empty_lines)
-        )
-        return [
-            m.group(capture_group) for m in match_list if m
-        ]
+        return list(_iter_match_lines(self.lines(include_empty_lines), pattern, capture_group))
 
     def match_lines_multi_group(self, pattern, capture_groups: List[Union[str, int]], include_empty_lines=False) -> List[List[Union[str, None]]]:
-        match_list = (
-            re.match(pattern, el) for el in self.lines(include_empty_lines)
-        )
-        return [
-            [
-                m.group(g) for g in capture_groups
-            ] for m in match_list if m
-        ]
+        return list(_iter_match_lines_multi_group(self.lines(include_empty_lines), pattern, capture_groups))
 
     def columns(self, *column_index, splitter: Splitter = default_splitter, maxsplit=0):
-        def _process_line(line):
-            split_line = splitter(line, maxsplit=maxsplit)
-            if not column_index:
-                return split_line
-            else:
-                return [(split_line[i:i + 1] or [None])[0] for i in column_index]
-
-        return [
-            _process_line(line) for line in self.lines(include_empty=False)
-        ]
+        return list(_iter_columns(self.lines(include_empty=False), column_index, splitter, maxsplit))
 
     def parse_table(self, splitter: Splitter = default_splitter):
         return parse_table(self.lines(include_empty=False), splitter)
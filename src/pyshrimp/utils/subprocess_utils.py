@@ -1,25 +1,53 @@
+import asyncio
+import locale
 import subprocess
-from typing import Union, Iterable
+import time
+from threading import Thread
+from typing import Union, Iterable, Optional, List, AnyStr
 
+# noinspection PyProtectedMember
+from pyshrimp._internal.utils.process_spawning import _popen
+from pyshrimp.utils.bytes_wrapper import BytesWrapper
+# noinspection PyProtectedMember
+from pyshrimp.utils.output_capture import CapturePolicy, SpilledOutput, _SpillingBuffer, _decode_text_output
+# noinspection PyProtectedMember
+from pyshrimp.utils.resource_usage import ProcessResourceUsage, _notify_execution_listeners
 from pyshrimp.utils.string_wrapper import StringWrapper
 
 RETURN_CODE_EXECUTION_FAILED = 300
 
 
+def _resource_usage_of(p: subprocess.Popen) -> Optional[ProcessResourceUsage]:
+    resource_usage_fields = getattr(p, 'resource_usage_fields', None)
+    return ProcessResourceUsage(**resource_usage_fields()) if resource_usage_fields else None
+
+
+def _wrap_output(data: Optional[AnyStr], binary=False) -> Union[StringWrapper, BytesWrapper, SpilledOutput]:
+    if isinstance(data, SpilledOutput):
+        return data
+
+    if binary:
+        return BytesWrapper(data or b'')
+    else:
+        return StringWrapper(data or '')
+
+
 class ProcessExecutionResult(object):
     def __init__(
             self,
             command: Union[str, Iterable],
-            standard_output: StringWrapper,
-            error_output: StringWrapper,
+            standard_output: Union[StringWrapper, BytesWrapper, SpilledOutput],
+            error_output: Union[StringWrapper, BytesWrapper, SpilledOutput],
             return_code: int,
-            exception=None
+            exception=None,
+            resource_usage: Optional[ProcessResourceUsage] = None
     ):
         self.command = command
         self.standard_output = standard_output
         self.error_output = error_output
         self.return_code = return_code
         self.exception = exception
+        self.resource_usage = resource_usage
 
     def is_ok(self):
         return self.return_code == 0
@@ -68,6 +96,52 @@ class ProcessExecutionResult(object):
         return self.return_code
 
 
+class BatchedProcessExecutionResult(ProcessExecutionResult):
+    """
+    Result of command executed in batches - the outputs of all batches are concatenated,
+    the details of each execution are available in `batches`.
+    """
+
+    def __init__(self, command, standard_output, error_output, return_code: int, batches: List[ProcessExecutionResult],
+                 exception=None):
+        super().__init__(command, standard_output, error_output, return_code, exception=exception)
+        self.batches = batches
+
+    @staticmethod
+    def merge(command, batches: List[ProcessExecutionResult], binary=False,
+              capture_policy: Optional[CapturePolicy] = None) -> 'BatchedProcessExecutionResult':
+        """
+        :param capture_policy: when provided the outputs are concatenated according to the policy - the merged output
+                               exceeding the memory limit stays spilled to disk; otherwise the spilled outputs
+                               are loaded into memory
+        """
+        def _join(outputs):
+            if capture_policy is not None:
+                buffer = _SpillingBuffer(capture_policy)
+                for el in outputs:
+                    if isinstance(el, SpilledOutput):
+                        el.write_to(buffer)
+                    else:
+                        buffer.write(el if binary else str(el).encode(locale.getpreferredencoding(False)))
+
+                return _collect_output(buffer, binary)
+
+            if binary:
+                return b''.join(el.data() if isinstance(el, SpilledOutput) else el for el in outputs)
+            else:
+                return ''.join(str(el) for el in outputs)
+
+        failed = [res for res in batches if not res.is_ok()]
+        return BatchedProcessExecutionResult(
+            command=command,
+            standard_output=_wrap_output(_join(res.standard_output for res in batches), binary),
+            error_output=_wrap_output(_join(res.error_output for res in batches), binary),
+            return_code=failed[0].return_code if failed else 0,
+            exception=failed[0].exception if failed else None,
+            batches=batches
+        )
+
+
 class ProcessExecutionException(Exception):
 
     def __init__(self, message: str, result: ProcessExecutionResult) -> None:
@@ -80,33 +154,327 @@ class ProcessExecutionException(Exception):
 
 
 def run_process(command: Union[str, Iterable], timeout=None, cmd_in=None, capture_out=True, capture_err=True,
-                run_in_shell=False, cwd=None, env=None) -> ProcessExecutionResult:
+                run_in_shell=False, cwd=None, env=None, binary=False, fast_spawn=False,
+                capture_policy: Optional[CapturePolicy] = None) -> ProcessExecutionResult:
+    """
+    Runs the process and collects the output.
+
+    When `binary` is set the input and output is passed as raw bytes (no decoding and no newline translation)
+    and the outputs are wrapped with `BytesWrapper`.
+    When `fast_spawn` is set the process is created with posix_spawn if possible (see `_popen` for details).
+    When `capture_policy` is provided the outputs exceeding the memory limit are spilled to disk
+    and returned as `SpilledOutput`.
+    """
     try:
-        p = subprocess.Popen(
+        p = _popen(
             command,
+            fast_spawn=fast_spawn,
             stdin=None if cmd_in is None else subprocess.PIPE,
             stdout=subprocess.PIPE if capture_out else None,
             stderr=subprocess.PIPE if capture_err else None,
-            universal_newlines=True,
+            universal_newlines=not binary and capture_policy is None,
             shell=run_in_shell,
             cwd=cwd,
             env=env
         )
 
-        (out, err) = p.communicate(input=cmd_in, timeout=timeout)
+        if capture_policy is None:
+            (out, err) = p.communicate(input=cmd_in, timeout=timeout)
+        else:
+            (out, err) = _communicate_with_policy(p, cmd_in, timeout, capture_policy, binary)
+
+        result = ProcessExecutionResult(
+            command=command,
+            standard_output=_wrap_output(out, binary),
+            error_output=_wrap_output(err, binary),
+            return_code=p.returncode,
+            resource_usage=_resource_usage_of(p)
+        )
 
+    except Exception as e:
         return ProcessExecutionResult(
             command=command,
-            standard_output=StringWrapper(out or ''),
-            error_output=StringWrapper(err or ''),
-            return_code=p.returncode
+            standard_output=_wrap_output(None, binary),
+            error_output=_wrap_output(str(e).encode() if binary else str(e), binary),
+            return_code=RETURN_CODE_EXECUTION_FAILED,
+            exception=e
+        )
+
+    return _notify_execution_listeners(result)
+
+
+class ProcessBatchExecutionException(Exception):
+
+    def __init__(self, message: str, failed_results: List[ProcessExecutionResult]) -> None:
+        super().__init__(message)
+        self.failed_results = failed_results
+        self.message = message
+
+    def __str__(self):
+        return '\n'.join(
+            [self.message] + [
+                res.execution_report(f'Failure {idx + 1}/{len(self.failed_results)}')
+                for idx, res in enumerate(self.failed_results)
+            ]
+        )
+
+
+def _communicate_with_policy(p: subprocess.Popen, cmd_in: Optional[AnyStr], timeout, policy: CapturePolicy, binary: bool):
+    threads = []
+    buffers = []
+
+    def _start(target, *args):
+        t = Thread(target=target, args=args, daemon=True)
+        t.start()
+        threads.append(t)
+
+    for stream in (p.stdout, p.stderr):
+        buffer = _SpillingBuffer(policy) if stream is not None else None
+        buffers.append(buffer)
+        if buffer is not None:
+            _start(buffer.read_from, stream)
+
+    if cmd_in is not None:
+        def _feed_input():
+            try:
+                p.stdin.write(cmd_in.encode(locale.getpreferredencoding(False)) if isinstance(cmd_in, str) else cmd_in)
+                p.stdin.close()
+            except BrokenPipeError:
+                pass
+
+        _start(_feed_input)
+
+    try:
+        p.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        p.kill()
+        p.wait()
+        raise
+
+    for t in threads:
+        t.join()
+
+    return _collect_output(buffers[0], binary), _collect_output(buffers[1], binary)
+
+
+async def _communicate_with_policy_async(p: asyncio.subprocess.Process, cmd_in: Optional[bytes], policy: CapturePolicy,
+                                         binary: bool):
+    async def _read(stream: Optional[asyncio.StreamReader]) -> Optional[_SpillingBuffer]:
+        if stream is None:
+            return None
+
+        buffer = _SpillingBuffer(policy)
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+
+            buffer.write(chunk)
+
+        return buffer
+
+    async def _feed_input():
+        if cmd_in is None:
+            return
+
+        try:
+            p.stdin.write(cmd_in)
+            await p.stdin.drain()
+            p.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    out, err, _ = await asyncio.gather(_read(p.stdout), _read(p.stderr), _feed_input())
+    await p.wait()
+    return _collect_output(out, binary), _collect_output(err, binary)
+
+
+def _collect_output(buffer: Optional[_SpillingBuffer], binary: bool):
+    if buffer is None:
+        return None
+
+    data = buffer.collect(binary)
+    return data if binary or isinstance(data, SpilledOutput) else _decode_text_output(data)
+
+
+async def run_process_async(command: Union[str, Iterable], timeout=None, cmd_in=None, capture_out=True, capture_err=True,
+                            run_in_shell=False, cwd=None, env=None, binary=False,
+                            capture_policy: Optional[CapturePolicy] = None) -> ProcessExecutionResult:
+    """
+    Asynchronous version of `run_process` - runs the process using asyncio subprocess support
+    so waiting for the process does not block the event loop thread.
+    When `capture_policy` is provided the outputs exceeding the memory limit are spilled to disk
+    and returned as `SpilledOutput`.
+    """
+    p = None
+    started_at = time.perf_counter()
+    try:
+        spawn_args = dict(
+            stdin=None if cmd_in is None else subprocess.PIPE,
+            stdout=subprocess.PIPE if capture_out else None,
+            stderr=subprocess.PIPE if capture_err else None,
+            cwd=cwd,
+            env=env
+        )
+
+        if run_in_shell:
+            p = await asyncio.create_subprocess_shell(command, **spawn_args)
+        else:
+            p = await asyncio.create_subprocess_exec(*([command] if isinstance(command, str) else command), **spawn_args)
+
+        if isinstance(cmd_in, str):
+            cmd_in = cmd_in.encode(locale.getpreferredencoding(False))
+
+        if capture_policy is None:
+            (out, err) = await asyncio.wait_for(p.communicate(input=cmd_in), timeout=timeout)
+            if not binary:
+                (out, err) = (_decode_text_output(out), _decode_text_output(err))
+        else:
+            (out, err) = await asyncio.wait_for(
+                _communicate_with_policy_async(p, cmd_in, capture_policy, binary), timeout=timeout
+            )
+
+        # the asyncio reaps the process on its own - only the wall time is known
+        result = ProcessExecutionResult(
+            command=command,
+            standard_output=_wrap_output(out, binary),
+            error_output=_wrap_output(err, binary),
+            return_code=p.returncode,
+            resource_usage=ProcessResourceUsage(wall_time_sec=time.perf_counter() - started_at)
         )
 
     except Exception as e:
+        if p is not None and p.returncode is None:
+            p.kill()
+            await p.wait()
+
         return ProcessExecutionResult(
             command=command,
-            standard_output=StringWrapper(''),
-            error_output=StringWrapper(str(e)),
+            standard_output=_wrap_output(None, binary),
+            error_output=_wrap_output(str(e).encode() if binary else str(e), binary),
             return_code=RETURN_CODE_EXECUTION_FAILED,
             exception=e
         )
+
+    return _notify_execution_listeners(result)
+
+
+class ProcessOutputStream:
+    """
+    Iterator over the standard output of running process.
+
+    The output is consumed as it is produced (line by line or in chunks) so the memory usage stays bounded
+    regardless of the amount of data produced by the process. The error output is collected in background.
+    The `result` becomes available once the stream is exhausted or closed.
+    """
+
+    def __init__(self, command: Union[str, Iterable], process: subprocess.Popen, cmd_in: Optional[AnyStr] = None,
+                 check=False, chunk_size: Optional[int] = None, binary=False) -> None:
+        self._command = command
+        self._process = process
+        self._check = check
+        self._chunk_size = chunk_size
+        self._binary = binary
+        self._result: Optional[ProcessExecutionResult] = None
+        self._err_chunks: List[AnyStr] = []
+        self._threads = []
+
+        if process.stderr is not None:
+            self._start_thread(self._collect_err)
+
+        if cmd_in is not None:
+            self._start_thread(self._feed_input, cmd_in)
+
+    def _start_thread(self, target, *args):
+        t = Thread(target=target, args=args, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _collect_err(self):
+        for chunk in iter(lambda: self._process.stderr.read(8192), b'' if self._binary else ''):
+            self._err_chunks.append(chunk)
+
+    def _feed_input(self, cmd_in: AnyStr):
+        try:
+            self._process.stdin.write(cmd_in)
+            self._process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            # process stopped reading - nothing more to do here
+            pass
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> AnyStr:
+        if self._result is not None:
+            raise StopIteration()
+
+        stdout = self._process.stdout
+        data = stdout.read(self._chunk_size) if self._chunk_size else stdout.readline()
+        if data:
+            return data
+
+        self._finish(abandoned=False)
+        raise StopIteration()
+
+    def _finish(self, abandoned: bool):
+        if self._process.stdout is not None:
+            self._process.stdout.close()
+
+        if abandoned and self._process.poll() is None:
+            self._process.terminate()
+
+        self._process.wait()
+        for t in self._threads:
+            t.join()
+
+        if self._process.stderr is not None:
+            self._process.stderr.close()
+
+        self._result = ProcessExecutionResult(
+            command=self._command,
+            standard_output=_wrap_output(None, self._binary),
+            error_output=_wrap_output((b'' if self._binary else '').join(self._err_chunks), self._binary),
+            return_code=self._process.returncode,
+            resource_usage=_resource_usage_of(self._process)
+        )
+        _notify_execution_listeners(self._result)
+
+        if self._check and not abandoned:
+            self._result.raise_if_not_ok()
+
+    def close(self) -> ProcessExecutionResult:
+        """
+        Stops the streaming. Process which is still running is terminated.
+        """
+        if self._result is None:
+            self._finish(abandoned=True)
+
+        return self._result
+
+    @property
+    def result(self) -> Optional[ProcessExecutionResult]:
+        return self._result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def stream_process(command: Union[str, Iterable], cmd_in=None, capture_err=True, run_in_shell=False, cwd=None, env=None,
+                   check=False, chunk_size: Optional[int] = None, binary=False, fast_spawn=False) -> ProcessOutputStream:
+    p = _popen(
+        command,
+        fast_spawn=fast_spawn,
+        stdin=None if cmd_in is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE if capture_err else None,
+        universal_newlines=not binary,
+        shell=run_in_shell,
+        cwd=cwd,
+        env=env
+    )
+
+    return ProcessOutputStream(command=command, process=p, cmd_in=cmd_in, check=check, chunk_size=chunk_size, binary=binary)
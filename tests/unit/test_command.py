@@ -1,8 +1,13 @@
+import asyncio
 import os
+import time
 from unittest import TestCase, skipIf
+from unittest.mock import patch
 
-from pyshrimp.utils.command import shell_cmd, cmd, SkipConfig, Command, CommandArgProcessor
-from pyshrimp.utils.subprocess_utils import ProcessExecutionException
+from pyshrimp.exception import IllegalArgumentException
+# noinspection PyProtectedMember
+from pyshrimp.utils.command import shell_cmd, cmd, SkipConfig, Command, CommandArgProcessor, _split_into_batches
+from pyshrimp.utils.subprocess_utils import ProcessExecutionException, ProcessBatchExecutionException
 from common.platform_utils import runOnUnixOnly
 
 
@@ -114,4 +119,141 @@ class TestCommand(TestCase):
         self.assertEqual(dir2, pwd.exec(cwd=dir2).standard_output)
 
         # shell command should also work
-        self.assertEqual(dir2, shell_cmd('echo -n `pwd`', cwd=dir2).exec().standard_output)
\ No newline at end of file
+        self.assertEqual(dir2, shell_cmd('echo -n `pwd`', cwd=dir2).exec().standard_output)
+
+    def test_command_stream_should_yield_lines_as_they_are_produced(self):
+        stream = shell_cmd('echo line1; echo line2 >&2; echo line3').stream()
+        self.assertEqual('line1\n', next(stream))
+        self.assertEqual(['line3\n'], list(stream))
+        self.assertEqual(0, stream.result.return_code)
+        self.assertEqual('line2\n', stream.result.error_output)
+
+    def test_command_stream_should_check_return_code_when_stream_is_exhausted(self):
+        stream = shell_cmd('echo line1; exit 3', check=True).stream()
+        self.assertEqual('line1\n', next(stream))
+        with self.assertRaises(ProcessExecutionException) as ctx:
+            next(stream)
+
+        self.assertEqual(3, ctx.exception.result.return_code)
+
+    def test_command_stream_should_terminate_process_when_closed_early(self):
+        with cmd('yes', check=True).stream() as stream:
+            self.assertEqual('y\n', next(stream))
+
+        self.assertNotEqual(0, stream.result.return_code)
+
+    def test_command_stream_should_support_input_and_chunks(self):
+        stream = cmd('cat').stream(cmd_in='abcdefg', chunk_size=3)
+        self.assertEqual(['abc', 'def', 'g'], list(stream))
+
+    def test_command_in_binary_mode_should_pass_raw_bytes(self):
+        data = bytes(range(256)) + b'\r\n'
+        res = cmd('cat', binary=True).exec(cmd_in=data)
+        self.assertIsInstance(res.standard_output, bytes)
+        self.assertEqual(data, res.standard_output)
+        self.assertEqual(b'', res.error_output)
+        self.assertEqual('x\n', shell_cmd('echo x', binary=True).exec().out.text())
+
+    def test_command_exec_async_should_run_commands_concurrently(self):
+        async def _run_all():
+            sleep = shell_cmd('sleep 0.3; echo -n "$1"')
+            return await asyncio.gather(*[sleep.exec_async(i) for i in range(10)])
+
+        started_at = time.time()
+        results = asyncio.run(_run_all())
+
+        self.assertLess(time.time() - started_at, 2)
+        self.assertEqual([str(i) for i in range(10)], [res.standard_output for res in results])
+        self.assertEqual(['1'], results[1].out.lines())
+
+    def test_command_exec_async_should_support_input_and_check(self):
+        res = asyncio.run(cmd('wc', '-c').exec_async(cmd_in='1234'))
+        self.assertEqual('4', res.standard_output.strip())
+
+        with self.assertRaises(ProcessExecutionException):
+            asyncio.run(cmd('false').exec_async())
+
+    def test_command_map_should_run_concurrently_and_keep_order(self):
+        sleep = shell_cmd('sleep "$1"; echo -n "$1"')
+        started_at = time.time()
+        results = list(sleep.map(['0.4', '0.1', '0.3', '0.2'], max_workers=4))
+
+        self.assertLess(time.time() - started_at, 1)
+        self.assertEqual(['0.4', '0.1', '0.3', '0.2'], [res.standard_output for res in results])
+
+    def test_command_map_should_yield_as_completed_when_not_ordered(self):
+        sleep = shell_cmd('sleep "$1"; echo -n "$2"')
+        results = list(sleep.map([('0.6', 'a'), ('0.1', 'b')], max_workers=2, ordered=False))
+        self.assertEqual(['b', 'a'], [res.standard_output for res in results])
+
+    def test_command_map_should_collect_failures(self):
+        exit_with = shell_cmd('exit "$1"')
+        results = []
+        with self.assertRaises(ProcessBatchExecutionException) as ctx:
+            for res in exit_with.map(range(5), max_workers=2):
+                results.append(res)
+
+        self.assertEqual([0, 1, 2, 3, 4], [res.return_code for res in results])
+        self.assertEqual([1, 2, 3, 4], [res.return_code for res in ctx.exception.failed_results])
+
+    def test_command_should_inherit_environment_when_there_are_no_overrides(self):
+        self.assertIsNone(cmd('env')._build_env())
+        with patch.dict(os.environ, {'PYSHRIMP_TEST_VAR': 'inherited'}):
+            self.assertEqual('inherited', shell_cmd('echo -n $PYSHRIMP_TEST_VAR').exec().standard_output)
+
+    def test_command_should_reuse_built_environment_until_os_environ_changes(self):
+        command = shell_cmd('echo -n $PYSHRIMP_TEST_VAR:$PYSHRIMP_TEST_OVERRIDE', env={'PYSHRIMP_TEST_OVERRIDE': 'o'})
+        with patch.dict(os.environ, {'PYSHRIMP_TEST_VAR': 'v1'}):
+            env1 = command._build_env()
+            self.assertIs(env1, command._build_env())
+            self.assertEqual('v1:o', command.exec().standard_output)
+
+            os.environ['PYSHRIMP_TEST_VAR'] = 'v2'
+            self.assertIsNot(env1, command._build_env())
+            self.assertEqual('v2:o', command.exec().standard_output)
+
+    def test_command_should_not_inherit_environment_when_instructed(self):
+        command = cmd('/usr/bin/env', env={'A': '1'}, env_append=False)
+        self.assertEqual('A=1\n', command.exec().standard_output)
+
+    def test_command_exec_batched_should_split_items_into_batches(self):
+        items = [f'item{i}' for i in range(10)]
+        res = shell_cmd('echo "$#:$1:$*"').exec_batched('prefix', items=items, max_args=4, parallel=3)
+
+        self.assertEqual(3, len(res.batches))
+        self.assertEqual(
+            '5:prefix:prefix item0 item1 item2 item3\n'
+            '5:prefix:prefix item4 item5 item6 item7\n'
+            '3:prefix:prefix item8 item9\n',
+            res.standard_output
+        )
+
+    def test_command_exec_batched_should_fit_arguments_into_system_limit(self):
+        items = ['x' * 1000] * 10000
+        res = cmd('printf', '%.1s').exec_batched(items=items)
+        self.assertGreater(len(res.batches), 1)
+        self.assertEqual('x' * 10000, res.standard_output)
+
+    def test_command_exec_batched_should_report_failed_batch(self):
+        res = shell_cmd('for el in "$@"; do [[ $el != bad ]] || exit 3; done').exec_batched(
+            items=['a', 'b', 'bad', 'c'], max_args=2, check=False
+        )
+        self.assertEqual(3, res.return_code)
+        self.assertEqual([0, 3], [el.return_code for el in res.batches])
+
+    def test_command_exec_batched_should_apply_max_bytes_to_command_line_only(self):
+        # the environment may be bigger than max_bytes - it is not part of the limit (as with xargs -s)
+        res = cmd('echo', env={'BIG': 'x' * 1000}).exec_batched(items=['a', 'b', 'c'], max_bytes=40)
+        self.assertEqual('a b\nc\n', str(res.standard_output))
+        self.assertEqual(2, len(res.batches))
+
+    def test_command_exec_batched_should_report_environment_exceeding_arg_max(self):
+        with patch('pyshrimp.utils.command._arg_max', return_value=100):
+            with self.assertRaisesRegex(IllegalArgumentException, 'environment'):
+                cmd('echo', env={'BIG': 'x' * 1000}).exec_batched(items=['a'])
+
+    def test_split_into_batches_should_respect_limits(self):
+        self.assertEqual([['a', 'b'], ['c']], _split_into_batches(['a', 'b', 'c'], max_args=2, max_bytes=1000))
+        self.assertEqual([['aa'], ['bb'], ['c']], _split_into_batches(['aa', 'bb', 'c'], max_args=None, max_bytes=20))
+        with self.assertRaises(IllegalArgumentException):
+            _split_into_batches(['a' * 100], max_args=None, max_bytes=20)
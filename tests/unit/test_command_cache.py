@@ -0,0 +1,76 @@
+import asyncio
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from common.platform_utils import runOnUnixOnly
+from pyshrimp.utils.command import shell_cmd
+from pyshrimp.utils.command_cache import CommandResultCache
+from pyshrimp.utils.string_wrapper import StringWrapper
+from pyshrimp.utils.subprocess_utils import ProcessExecutionResult
+
+
+def _result(out):
+    return ProcessExecutionResult(['cmd'], StringWrapper(out), StringWrapper(''), 0)
+
+
+@runOnUnixOnly
+class TestCommandCache(TestCase):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._counter_file = os.path.join(self._tmp_dir.name, 'counter')
+        # prints the number of executions so far
+        self._counting_script = f'echo -n x >> {self._counter_file}; wc -c < {self._counter_file} | tr -d " "; echo -n "$1"'
+        self._counting_cmd = shell_cmd(self._counting_script)
+
+    def tearDown(self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_command_with_cache_ttl_should_reuse_result(self):
+        counter = self._counting_cmd.with_cache(CommandResultCache(ttl_sec=60))
+        self.assertEqual('1\na', counter('a').standard_output)
+        self.assertEqual('1\na', counter('a').standard_output)
+        self.assertEqual('2\nb', counter('b').standard_output)
+        self.assertEqual('3\na', counter('a', cmd_in='other input').standard_output)
+
+        counter.invalidate_cache('a')
+        self.assertEqual('4\na', counter('a').standard_output)
+        self.assertEqual('2\nb', counter('b').standard_output)
+
+    def test_exec_async_should_use_cache(self):
+        counter = self._counting_cmd.with_cache(CommandResultCache(ttl_sec=60))
+        self.assertEqual('1\na', asyncio.run(counter.exec_async('a')).standard_output)
+        self.assertEqual('1\na', asyncio.run(counter.exec_async('a')).standard_output)
+        self.assertEqual('1\na', counter('a').standard_output)
+
+    def test_cached_results_should_expire(self):
+        counter = shell_cmd(self._counting_script, cache_ttl=0.2)
+        self.assertEqual('1\n', counter().standard_output)
+        self.assertEqual('1\n', counter().standard_output)
+        time.sleep(0.3)
+        self.assertEqual('2\n', counter().standard_output)
+
+    def test_cache_should_evict_least_recently_used_entries(self):
+        cache = CommandResultCache(ttl_sec=60, max_entries=2)
+        cache.put('a', _result('a'))
+        cache.put('b', _result('b'))
+        self.assertEqual('a', cache.get('a').standard_output)
+        cache.put('c', _result('c'))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('a', cache.get('a').standard_output)
+        self.assertEqual('c', cache.get('c').standard_output)
+
+    def test_persistent_cache_should_be_shared_between_instances(self):
+        persist_dir = os.path.join(self._tmp_dir.name, 'cache')
+        cache1 = CommandResultCache(ttl_sec=60, persist=True, persist_dir=persist_dir)
+        cache1.put(('echo', 'x'), _result('x'))
+
+        cache2 = CommandResultCache(ttl_sec=60, persist=True, persist_dir=persist_dir)
+        self.assertEqual('x', cache2.get(('echo', 'x')).standard_output)
+        self.assertIsInstance(cache2.get(('echo', 'x')).standard_output, StringWrapper)
+
+        cache2.invalidate()
+        self.assertIsNone(CommandResultCache(ttl_sec=60, persist=True, persist_dir=persist_dir).get(('echo', 'x')))
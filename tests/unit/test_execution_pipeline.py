@@ -1,14 +1,28 @@
+import asyncio
+import hashlib
+import os
 import re
+import signal
+import stat
+import tempfile
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from io import StringIO
 from unittest import TestCase
 from unittest.mock import patch
 
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.channel import _open_queue_channel, _open_queue_batch_channel
+# noinspection PyProtectedMember
+from pyshrimp._internal.pipes.utils import _forward_fd, _get_pipe_size, _open_data_as_fd
 from pyshrimp.exception import IllegalArgumentException
+from pyshrimp.execution_pipeline.codecs import JsonLinesCodec, TsvCodec
 from pyshrimp.execution_pipeline.pipeline import ExecutionPipeline
-from pyshrimp.execution_pipeline.pipeline_starter import PIPE, PIPE_END, PIPE_END_STDOUT
+from pyshrimp.execution_pipeline.pipeline_starter import PIPE, PIPE_END, PIPE_END_STDOUT, PIPE_ITER, PIPE_TO_FILE
 from pyshrimp.utils.command import cmd, shell_cmd
+from pyshrimp.utils.dotdict import as_dot_dict
 from common.platform_utils import runOnUnixOnly
 
 @runOnUnixOnly
@@ -234,3 +248,548 @@ class TestExecutionPipeline(TestCase):
             r'Asynchronous function must accept both stream_input and stream_output but found only one. Function args: stream_input'
         ):
             (PIPE | (lambda stream_input: None)).close()
+
+    def test_binary_pipeline_should_pass_raw_bytes_between_stages(self):
+        data = bytes(range(256)) * 100
+
+        def _reverse(stream_input, stream_output):
+            stream_output.write(stream_input.read()[::-1])
+
+        res = (
+            PIPE.binary().attach_text(data)
+            | cmd('gzip')
+            | 'gzip -d'
+            | _reverse
+            | (lambda out: out[::-1])
+            | PIPE_END_STDOUT
+        )
+        self.assertEqual(data, res)
+
+    def test_async_function_should_receive_text_input_as_stream(self):
+        def _upper(stream_input, stream_output):
+            for line in stream_input:
+                stream_output.write(line.upper())
+
+        self.assertEqual('HELLO\n', PIPE.text('hello\n') | _upper | PIPE_END_STDOUT)
+
+    def test_pipeline_close_async_should_collect_output(self):
+        async def _run():
+            return await (PIPE.text('hello world') | cmd(['wc', '-c']) | cmd(['tr', '-d', ' '])).close_async()
+
+        self.assertEqual('11\n', asyncio.run(_run()).stdout)
+
+    def test_pipeline_close_async_should_use_given_executor(self):
+        threads = []
+        original_close = ExecutionPipeline.close
+
+        def _close(pipeline, timeout=None):
+            threads.append(threading.current_thread().name)
+            return original_close(pipeline, timeout)
+
+        async def _run(executor):
+            return await asyncio.gather(*[(PIPE.text(f'{i}\n') | 'cat').close_async(executor=executor) for i in range(3)])
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipelines') as executor:
+            with patch.object(ExecutionPipeline, 'close', _close):
+                results = asyncio.run(_run(executor))
+
+        self.assertEqual(['0\n', '1\n', '2\n'], [res.stdout for res in results])
+        self.assertEqual(['pipelines_0'] * 3, threads)
+
+    def test_generator_function_should_process_lines_lazily(self):
+        consumed = []
+
+        def _numbers(lines):
+            for line in lines:
+                consumed.append(line.strip())
+                yield f'{int(line) * 2}\n'
+
+        def _take_two(lines):
+            yield next(lines)
+            yield next(lines)
+
+        res = PIPE.text('1\n2\n3\n4\n5\n') | _numbers | _take_two | PIPE_END_STDOUT
+        self.assertEqual('2\n4\n', res)
+        self.assertEqual(['1', '2'], consumed)
+
+    def test_generator_function_should_stream_between_commands(self):
+        def _prefix(lines):
+            for line in lines:
+                yield f'> {line}'
+
+        res = (
+            PIPE.text('b\na\nc\n')
+            | 'cat'
+            | _prefix
+            | cmd(['sort'])
+            | (lambda out: out.upper())
+            | PIPE_END_STDOUT
+        )
+        self.assertEqual('> A\n> B\n> C\n', res)
+
+    def test_generator_function_output_should_feed_async_function(self):
+        def _numbers(lines):
+            yield from (f'{i}\n' for i in range(3))
+
+        def _join(stream_input, stream_output):
+            stream_output.write(','.join(line.strip() for line in stream_input))
+
+        self.assertEqual('0,1,2', PIPE | _numbers | _join | PIPE_END_STDOUT)
+
+    def test_generator_function_exception_should_be_reported_in_result(self):
+        def _failing(lines):
+            yield next(lines)
+            raise ValueError('boom')
+
+        res = (PIPE.text('a\nb\n') | _failing).close()
+        self.assertEqual('a\n', res.stdout)
+        self.assertIsInstance(res.exception, ValueError)
+
+    def test_pipeline_should_not_block_on_large_stderr_of_command(self):
+        res = (
+            PIPE
+            | shell_cmd('head -c 1000000 /dev/zero >&2; echo done', check=False)
+            | (lambda lines: (line.upper() for line in lines))
+            | PIPE_END_STDOUT
+        )
+        self.assertEqual('DONE\n', res)
+
+    def test_consecutive_python_stages_should_not_use_pipes(self):
+        def _split_words(stream_input, stream_output):
+            for line in stream_input:
+                for word in line.split():
+                    # partial lines are joined by the consumer
+                    stream_output.write(word)
+                    stream_output.write('\n')
+
+        def _upper(stream_input, stream_output):
+            for line in stream_input:
+                stream_output.write(line.upper())
+
+        def _number(lines):
+            for i, line in enumerate(lines):
+                yield f'{i}:{line}'
+
+        with patch('os.pipe', side_effect=AssertionError('pipe should not be used')):
+            res = PIPE.text('hello big\nworld\n') | _split_words | _upper | _number | PIPE_END_STDOUT
+
+        self.assertEqual('0:HELLO\n1:BIG\n2:WORLD\n', res)
+
+    def test_queue_channel_should_pass_writes_in_blocks(self):
+        writer, reader = _open_queue_channel(max_chunks=1000)
+        # the lines are split across the writes and the blocks
+        for i in range(20000):
+            writer.write(f'{i}\nx')
+        writer.close()
+
+        self.assertLess(writer._queue.qsize(), 10)
+        lines = list(reader)
+        self.assertEqual(20001, len(lines))
+        self.assertEqual(['0\n', 'x1\n'], lines[:2])
+        self.assertEqual('x', lines[-1])
+
+    def test_queue_channel_should_pass_slow_writes_without_waiting_for_full_block(self):
+        writer, reader = _open_queue_channel()
+
+        def _write_slowly():
+            for i in range(3):
+                writer.write(f'{i}\n')
+                time.sleep(0.5)
+            writer.close()
+
+        thread = threading.Thread(target=_write_slowly)
+        start = time.perf_counter()
+        thread.start()
+        received = [(line, time.perf_counter() - start) for line in reader]
+        thread.join()
+
+        self.assertEqual(['0\n', '1\n', '2\n'], [line for line, _ in received])
+        for i, (_, elapsed) in enumerate(received):
+            self.assertLess(elapsed, i * 0.5 + 0.3)
+
+    def test_queue_batch_channel_should_pass_items_of_all_writers_in_batches(self):
+        writers, reader = _open_queue_batch_channel(writers=2, batch_size=100, max_batches=4)
+
+        def _write(writer, name):
+            for i in range(1000):
+                writer.write((name, i))
+            writer.close()
+
+        threads = [threading.Thread(target=_write, args=(writer, name)) for writer, name in zip(writers, 'ab')]
+        for thread in threads:
+            thread.start()
+        items = list(reader)
+        for thread in threads:
+            thread.join()
+
+        # the order of the items of each writer is kept
+        self.assertEqual([('a', i) for i in range(1000)], [item for item in items if item[0] == 'a'])
+        self.assertEqual([('b', i) for i in range(1000)], [item for item in items if item[0] == 'b'])
+
+    def test_python_stage_writer_should_get_broken_pipe_when_consumer_stops(self):
+        def _endless(stream_input, stream_output):
+            while True:
+                stream_output.write('y\n')
+
+        def _first(lines):
+            yield next(lines)
+
+        p = PIPE | _endless | _first
+        self.assertEqual('y\n', p.close().stdout)
+        self.assertIsInstance(p._items[0].result.exception, BrokenPipeError)
+
+    def test_pipeline_should_resize_pipes_between_stages(self):
+        sizes = []
+
+        def _pipe_size(stream_input, stream_output):
+            sizes.append(_get_pipe_size(stream_input))
+            stream_output.write(stream_input.read())
+
+        res = (
+            ExecutionPipeline(pipe_buffer_size=256 * 1024)
+            | ['seq', '1', '100000']
+            | _pipe_size
+            | 'wc -l'
+            | PIPE_END_STDOUT
+        )
+        self.assertEqual('100000', res.strip())
+        self.assertEqual([256 * 1024], sizes)
+
+    def test_forward_fd_should_move_data_between_pipes_and_files(self):
+        data = bytes(range(256)) * 4096
+        with tempfile.TemporaryFile() as src, tempfile.TemporaryFile() as dst:
+            src.write(data)
+            src.flush()
+            src.seek(0)
+
+            # file -> file
+            self.assertEqual(len(data), _forward_fd(src.fileno(), dst.fileno()))
+            dst.seek(0)
+            self.assertEqual(data, dst.read())
+
+            # pipe -> file
+            dst.seek(0)
+            dst.truncate()
+            pipe_r, pipe_w = os.pipe()
+            writer = threading.Thread(target=lambda: (os.write(pipe_w, data), os.close(pipe_w)))
+            writer.start()
+            self.assertEqual(len(data), _forward_fd(pipe_r, dst.fileno()))
+            writer.join()
+            os.close(pipe_r)
+            dst.seek(0)
+            self.assertEqual(data, dst.read())
+
+    def test_text_input_should_be_fed_to_command_without_thread(self):
+        small_text = 'hello\n' * 100
+        big_text = 'zażółć\n' * 500000
+
+        with patch('pyshrimp.execution_pipeline.pipeline.Thread', side_effect=AssertionError('feeding thread should not be used')):
+            small = PIPE.text(small_text) | ['wc', '-c'] | PIPE_END_STDOUT
+            big = PIPE.text(big_text) | ['md5sum'] | PIPE_END_STDOUT
+
+        self.assertEqual(str(len(small_text)), small.strip())
+        self.assertEqual(hashlib.md5(big_text.encode('utf-8')).hexdigest(), big.split()[0])
+
+    def test_open_data_as_fd_should_use_file_for_data_bigger_than_pipe(self):
+        data = b'x' * (10 * 1024 * 1024)
+        fd = _open_data_as_fd(data)
+        try:
+            self.assertFalse(stat.S_ISFIFO(os.fstat(fd).st_mode))
+            with os.fdopen(os.dup(fd), 'rb') as f:
+                self.assertEqual(data, f.read())
+        finally:
+            os.close(fd)
+
+        fd = _open_data_as_fd('small')
+        try:
+            self.assertTrue(stat.S_ISFIFO(os.fstat(fd).st_mode))
+            self.assertEqual(b'small', os.read(fd, 100))
+        finally:
+            os.close(fd)
+
+    def test_pipe_iter_should_stream_output_lines_and_collect_result(self):
+        lines = PIPE | ['seq', '1', '5'] | (lambda lines: (f'<{line.strip()}>\n' for line in lines)) | 'cat' | PIPE_ITER
+        self.assertEqual(['<1>\n', '<2>\n', '<3>\n', '<4>\n', '<5>\n'], list(lines))
+        self.assertEqual(0, lines.result.result.return_code)
+
+    def test_iter_lines_should_stop_pipeline_when_abandoned(self):
+        with (PIPE | 'yes' | 'cat').iter_lines() as lines:
+            self.assertEqual('y\n', next(lines))
+
+        self.assertIsNotNone(lines.result)
+        self.assertEqual([], list(lines))
+
+    def test_iter_lines_closed_early_should_not_fail_last_stage_stopped_by_consumer(self):
+        stream = PIPE | 'seq 1000000' | PIPE_ITER
+        self.assertEqual(['1\n', '2\n', '3\n'], [next(stream) for _ in range(3)])
+        res = stream.close()
+
+        self.assertIn(res.stages[-1].return_code, (0, -signal.SIGPIPE, 128 + signal.SIGPIPE))
+        self.assertTrue(res.is_ok())
+
+    def test_iter_lines_exhausted_should_report_last_stage_failure(self):
+        stream = PIPE | 'echo a; exit 3' | PIPE_ITER
+        self.assertEqual(['a\n'], list(stream))
+        self.assertEqual(3, stream.result.return_code)
+
+    def test_iter_lines_should_finalize_pipeline_when_loop_is_broken(self):
+        pipeline = PIPE | 'yes' | 'cat'
+        for _ in pipeline.iter_lines():
+            break
+
+        self.assertTrue(all(el._closed for el in pipeline._items))
+
+    def test_instrumented_pipeline_should_report_stage_traffic(self):
+        def _double(lines):
+            for line in lines:
+                yield line
+                yield line
+
+        res = (
+            ExecutionPipeline(instrument=True)
+            | ['seq', '1', '1000']
+            | 'cat'
+            | _double
+            | shell_cmd('wc -l; exit 3', check=False)
+            | PIPE_END
+        )
+
+        self.assertEqual(['seq 1 1000', 'cat', '_double', 'wc -l; exit 3'], [s.name for s in res.stages])
+        seq, cat, double, wc = res.stages
+        self.assertEqual((None, 1000, 3893), (seq.lines_in, seq.lines_out, seq.bytes_out))
+        self.assertEqual((1000, 1000, 3893, 3893), (cat.lines_in, cat.lines_out, cat.bytes_in, cat.bytes_out))
+        self.assertEqual((1000, 2000), (double.lines_in, double.lines_out))
+        self.assertEqual((2000, 1), (wc.lines_in, wc.lines_out))
+        self.assertEqual([0, 0, None, 3], [s.return_code for s in res.stages])
+        self.assertTrue(all(s.wall_time_sec is not None and s.read_blocked_sec is not None for s in res.stages[1:]))
+        self.assertIn('_double', res.report())
+
+    def test_not_instrumented_pipeline_should_report_stage_results_only(self):
+        res = PIPE.text('a\n') | 'cat' | PIPE_END
+        self.assertEqual(['text', 'cat'], [s.name for s in res.stages])
+        self.assertEqual(0, res.stages[1].return_code)
+        self.assertIsNone(res.stages[1].bytes_in)
+
+    def test_pipeline_should_keep_stderr_tail_of_each_stage(self):
+        res = (
+            ExecutionPipeline(stderr_tail_bytes=10)
+            | shell_cmd('echo first-stage-error >&2; echo data', check=False)
+            | shell_cmd('cat; seq 1 100000 >&2', check=False)
+            | PIPE_END
+        )
+        self.assertEqual('data\n', res.stdout)
+        self.assertEqual(['age-error\n', '99\n100000\n'], [s.stderr for s in res.stages])
+        self.assertEqual('99\n100000\n', res.stderr)
+
+    def test_pipeline_stderr_tail_should_be_decoded_as_whole_stderr(self):
+        script = "printf 'a\\r\\nb\\r\\n' >&2"
+        tail = (ExecutionPipeline(stderr_tail_bytes=10) | shell_cmd(script, check=False) | PIPE_END).stderr
+        whole = (ExecutionPipeline() | shell_cmd(script, check=False) | PIPE_END).stderr
+        self.assertEqual('a\nb\n', tail)
+        self.assertEqual(whole, tail)
+
+    def test_pipeline_exit_code_should_come_from_last_stage_by_default(self):
+        res = PIPE | shell_cmd('echo a; exit 5', check=False) | 'cat' | PIPE_END
+        self.assertEqual(0, res.return_code)
+        self.assertTrue(res.is_ok())
+        self.assertEqual(5, res.stages[0].return_code)
+
+    def test_pipefail_should_report_rightmost_failed_stage(self):
+        res = (
+            ExecutionPipeline(pipefail=True)
+            | shell_cmd('echo a; exit 5', check=False)
+            | shell_cmd('cat; exit 7', check=False)
+            | 'cat'
+            | PIPE_END
+        )
+        self.assertEqual(7, res.return_code)
+        self.assertFalse(res.is_ok())
+
+    def test_pipefail_should_report_python_stage_failure(self):
+        def _failing(lines):
+            raise ValueError('boom')
+            # noinspection PyUnreachableCode
+            yield
+
+        res = ExecutionPipeline(pipefail=True).attach_text('a\n') | _failing | 'cat' | PIPE_END
+        self.assertEqual(1, res.return_code)
+
+    def test_pipefail_should_ignore_upstream_stopped_by_consumer(self):
+        res = ExecutionPipeline(pipefail=True) | 'yes' | 'head -n 1' | PIPE_END
+        self.assertEqual('y\n', res.stdout)
+        self.assertEqual(-signal.SIGPIPE, res.stages[0].return_code)
+        self.assertTrue(res.is_ok())
+
+    def test_pipefail_should_not_ignore_signal_return_codes_without_sigpipe(self):
+        # platforms without SIGPIPE (Windows)
+        with patch('pyshrimp.execution_pipeline.pipeline._SIGPIPE', None):
+            res = ExecutionPipeline(pipefail=True) | 'yes' | 'head -n 1' | PIPE_END
+
+        self.assertEqual(-signal.SIGPIPE, res.return_code)
+        self.assertFalse(res.is_ok())
+
+    def test_object_mode_should_pass_objects_between_python_stages(self):
+        def _parse(lines):
+            for record in lines:
+                yield {'name': record['name'], 'size': int(record['size'])}
+
+        def _big_only(records):
+            for record in records:
+                if record['size'] > 10:
+                    yield record
+
+        res = (
+            PIPE.objects(JsonLinesCodec()).attach_text('{"name": "a", "size": "5"}\n\n{"name": "b", "size": "50"}\n')
+            | _parse
+            | _big_only
+            | PIPE_END_STDOUT
+        )
+        self.assertEqual([{'name': 'b', 'size': 50}], res)
+
+    def test_object_mode_should_encode_objects_only_for_commands(self):
+        def _records(lines):
+            for name, size in lines:
+                yield {'name': name, 'size': int(size)}
+
+        def _names(records):
+            for record in records:
+                yield (record['name'], record['size'] * 2)
+
+        res = (
+            PIPE.objects(TsvCodec())
+            | shell_cmd("printf 'b\\t2\\na\\t1\\n'")
+            | _records
+            | _names
+            | 'sort'
+            | PIPE_END_STDOUT
+        )
+        self.assertEqual('a\t2\nb\t4\n', res)
+
+    def test_object_mode_iter_lines_should_decode_command_output(self):
+        codec = JsonLinesCodec(dot_dict=True)
+        with PIPE.objects(codec) | shell_cmd('echo \'{"id": 1}\'; echo \'{"id": 2}\'') | PIPE_ITER as records:
+            self.assertEqual([1, 2], [r.id for r in records])
+
+    def test_codecs_should_round_trip_records(self):
+        self.assertEqual({'a': [1, 2]}, JsonLinesCodec().decode(JsonLinesCodec().encode(as_dot_dict({'a': [1, 2]}))))
+        tsv = TsvCodec(columns=['name', 'size'])
+        self.assertEqual('x\t1\n', tsv.encode({'size': 1, 'name': 'x'}))
+        self.assertEqual({'name': 'x', 'size': '1'}, tsv.decode('x\t1\n'))
+
+    def test_file_source_and_sink_should_pass_file_descriptors(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            src = os.path.join(tmp_dir, 'in.txt')
+            dst = os.path.join(tmp_dir, 'out.txt')
+            with open(src, 'w') as f:
+                f.write('b\nc\na\n')
+
+            with patch('pyshrimp.execution_pipeline.pipeline._forward_fd', wraps=_forward_fd) as forward_fd:
+                res = PIPE.file(src) | 'sort' | PIPE_TO_FILE(dst)
+                PIPE.file(src) | ['head', '-n', '1'] | PIPE_TO_FILE(dst, append=True)
+
+            self.assertEqual(2, forward_fd.call_count)
+            self.assertTrue(res.is_ok())
+            with open(dst) as f:
+                self.assertEqual('a\nb\nc\nb\n', f.read())
+
+    def test_file_source_should_feed_python_stages(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as src, tempfile.TemporaryDirectory() as tmp_dir:
+            src.write('1\n2\n3\n')
+            src.flush()
+            dst = os.path.join(tmp_dir, 'out.txt')
+
+            self.assertEqual('1\n2\n3\n', PIPE.file(src.name) | PIPE_END_STDOUT)
+            PIPE.file(src.name) | (lambda lines: (f'{int(line) * 2}\n' for line in lines)) | PIPE_TO_FILE(dst)
+            with open(dst) as f:
+                self.assertEqual('2\n4\n6\n', f.read())
+
+    def test_close_with_timeout_should_kill_hung_stages(self):
+        started = time.perf_counter()
+        res = (PIPE | 'yes' | ['sleep', '30']).close(timeout=0.5)
+
+        self.assertLess(time.perf_counter() - started, 10)
+        self.assertTrue(res.timed_out)
+        self.assertFalse(res.is_ok())
+        self.assertEqual(-signal.SIGKILL, res.stages[-1].return_code)
+
+    def test_close_with_timeout_should_stop_function_threads(self):
+        def produce(stream_input, stream_output):
+            while True:
+                stream_output.write('x\n')
+
+        def consume(lines):
+            for _ in lines:
+                time.sleep(60)
+            yield ''
+
+        res = (PIPE | produce | ['cat'] | consume).close(timeout=0.5)
+
+        self.assertTrue(res.timed_out)
+        self.assertEqual(['produce', 'cat', 'consume'], [s.name for s in res.stages])
+        self.assertIsInstance(res.stages[-1].exception, TimeoutError)
+
+    def test_close_with_timeout_should_report_finished_upstream_stages(self):
+        def blocker(lines):
+            list(lines)
+            time.sleep(30)
+            yield ''
+
+        res = ExecutionPipeline().attach_all("seq 3; echo err >&2", blocker).close(timeout=0.3)
+
+        self.assertTrue(res.timed_out)
+        self.assertEqual(0, res.stages[0].return_code)
+        self.assertIsNone(res.stages[0].exception)
+        self.assertEqual('err\n', res.stages[0].stderr)
+        self.assertIsInstance(res.stages[1].exception, TimeoutError)
+
+    def test_close_with_timeout_should_kill_process_groups(self):
+        p = ExecutionPipeline(process_groups=True)
+        p.attach('sleep 30 | cat')
+        started = time.perf_counter()
+        res = p.close(timeout=0.5)
+
+        self.assertLess(time.perf_counter() - started, 10)
+        self.assertTrue(res.timed_out)
+        self.assertEqual(-signal.SIGKILL, res.stages[-1].return_code)
+
+    def test_close_with_timeout_should_not_affect_finished_pipeline(self):
+        res = (PIPE.text('a\n') | 'cat').close(timeout=10)
+
+        self.assertFalse(res.timed_out)
+        self.assertTrue(res.is_ok())
+        self.assertEqual('a\n', res.stdout)
+
+    def test_template_should_run_many_times_with_new_inputs_and_args(self):
+        def count(lines):
+            yield f'{sum(1 for _ in lines)}\n'
+
+        template = PIPE.template(['grep', PIPE.arg('pattern')], 'sort', count)
+
+        self.assertEqual('2\n', template.run('ab\nb\nc\n', pattern='b').stdout)
+        self.assertEqual('1\n', template.run('ab\nb\nc\n', pattern='c').stdout)
+        self.assertEqual(['1\n'], list(template.pipeline('a\nb\n', pattern='b') | PIPE_ITER))
+
+    def test_template_should_analyze_functions_and_commands_once(self):
+        template = PIPE.template('cat', ['tr', 'a', 'b'], lambda lines: (line.upper() for line in lines))
+
+        with patch('pyshrimp.execution_pipeline.pipeline.inspect.signature') as signature, \
+                patch('pyshrimp.execution_pipeline.pipeline.shell_cmd') as pipeline_shell_cmd, \
+                patch('pyshrimp.execution_pipeline.pipeline.cmd') as pipeline_cmd:
+            for _ in range(3):
+                self.assertEqual('BB\n', template.run('ab\n').stdout)
+
+        signature.assert_not_called()
+        pipeline_shell_cmd.assert_not_called()
+        pipeline_cmd.assert_not_called()
+
+    def test_template_should_validate_args(self):
+        template = PIPE.template(['grep', PIPE.arg('pattern')])
+
+        with self.assertRaises(IllegalArgumentException):
+            template.run('a\n')
+
+        with self.assertRaises(IllegalArgumentException):
+            template.run('a\n', pattern='a', other='b')
+
+        with self.assertRaises(IllegalArgumentException):
+            PIPE.template('cat', PIPE_END)
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from common.platform_utils import runOnUnixOnly
+from pyshrimp.utils.command import cmd, shell_cmd
+from pyshrimp.utils.output_capture import CapturePolicy, SpilledOutput
+from pyshrimp.utils.string_wrapper import StringWrapper
+from pyshrimp.utils.subprocess_utils import run_process
+
+
+@runOnUnixOnly
+class TestOutputCapture(TestCase):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._policy = CapturePolicy(max_memory_bytes=1024, spill_dir=self._tmp_dir.name)
+
+    def tearDown(self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_small_output_should_stay_in_memory(self):
+        res = shell_cmd('echo -n out; echo -n err >&2', capture_policy=self._policy).exec()
+        self.assertIsInstance(res.standard_output, StringWrapper)
+        self.assertEqual('out', res.standard_output)
+        self.assertEqual('err', res.error_output)
+
+    def test_big_output_should_be_spilled_to_disk(self):
+        res = run_process(['seq', '1', '10000'], capture_policy=self._policy).raise_if_not_ok()
+        out = res.standard_output
+
+        self.assertIsInstance(out, SpilledOutput)
+        self.assertEqual(len('\n'.join(str(i) for i in range(1, 10001))) + 1, len(out))
+        # the spilled file is not visible on the disk
+        self.assertEqual([], os.listdir(self._tmp_dir.name))
+
+        lines = out.lines()
+        self.assertEqual(['1', '2', '3'], [next(lines), next(lines), next(lines)])
+        self.assertEqual(['9999'], list(out.match_lines(r'^(9+)$'))[-1:])
+        self.assertEqual([['10', None]], list(out.columns(0, 1))[9:10])
+        self.assertEqual('1\n2\n', out.text()[:4])
+
+    def test_exec_async_should_spill_big_output_to_disk(self):
+        res = asyncio.run(cmd('cat', capture_policy=self._policy).exec_async(cmd_in='line\r\n' * 1000))
+        self.assertIsInstance(res.standard_output, SpilledOutput)
+        self.assertEqual('line\n' * 1000, res.standard_output.text())
+
+    def test_spilled_output_should_support_input_and_binary_mode(self):
+        data = bytes(range(256)) * 10
+        res = cmd('cat', binary=True).with_capture_policy(self._policy).exec(cmd_in=data)
+        self.assertIsInstance(res.standard_output, SpilledOutput)
+        self.assertEqual(data, res.standard_output.data())
+
+    def test_spilled_output_should_parse_table(self):
+        table = 'name value\n' + ''.join(f'n{i} {i}\n' for i in range(500))
+        res = cmd('cat', capture_policy=self._policy).exec(cmd_in=table)
+        parsed = res.standard_output.parse_table()
+        self.assertEqual(['name', 'value'], parsed.header)
+        self.assertEqual(['n499', '499'], parsed.rows[-1])
+
+    def test_spilled_text_should_be_decoded_as_output_kept_in_memory(self):
+        script = "for i in $(seq 1 1000); do printf 'line %s\\r\\n' $i; done"
+        in_memory = run_process(script, run_in_shell=True).standard_output
+        spilled = run_process(script, run_in_shell=True, capture_policy=self._policy).standard_output
+
+        self.assertIsInstance(spilled, SpilledOutput)
+        self.assertEqual(in_memory, spilled.text())
+        self.assertNotIn('\r', spilled.text())
+
+    def test_spilled_lines_should_be_split_as_output_kept_in_memory(self):
+        script = "for i in $(seq 1 500); do printf 'a %s\\r\\nb\\rc\\n\\n' $i; done"
+        in_memory = run_process(script, run_in_shell=True).standard_output
+        spilled = run_process(script, run_in_shell=True, capture_policy=self._policy).standard_output
+
+        self.assertIsInstance(spilled, SpilledOutput)
+        self.assertEqual(in_memory.lines(), list(spilled.lines()))
+        self.assertEqual(in_memory.lines(include_empty=True), list(spilled.lines(include_empty=True)))
+
+    def test_exec_batched_should_keep_merged_output_spilled(self):
+        res = shell_cmd('seq 1 500; echo "$@"', capture_policy=self._policy).exec_batched(items=['a', 'b'], max_args=1)
+        self.assertIsInstance(res.standard_output, SpilledOutput)
+        self.assertEqual([str(i) for i in range(1, 501)] * 2, [line for line in res.standard_output.lines() if line.isdigit()])
+        self.assertEqual(['a', 'b'], [line for line in res.standard_output.lines() if not line.isdigit()])
+
+    def test_spilled_output_should_close_when_mapping_fails(self):
+        with tempfile.TemporaryFile() as file:
+            file.write(b'data')
+            file.flush()
+            with patch('pyshrimp.utils.output_capture.mmap.mmap', side_effect=OSError('mmap failed')):
+                with self.assertRaises(OSError):
+                    SpilledOutput(file)
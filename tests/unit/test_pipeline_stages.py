@@ -0,0 +1,135 @@
+import os
+from unittest import TestCase
+
+from common.platform_utils import runOnUnixOnly
+from pyshrimp.exception import IllegalArgumentException, IllegalStateException
+from pyshrimp.execution_pipeline.pipeline_starter import PIPE, PIPE_END, PIPE_END_STDOUT
+from pyshrimp.execution_pipeline.stages import parallel_stage, head, take_while, tee, merge
+
+
+def _square_odd(line):
+    n = int(line)
+    return f'{n * n}\n' if n % 2 else None
+
+
+def _worker_pid(line):
+    return f'{os.getpid()}\n'
+
+
+def _worker_parent_pid(line):
+    return f'{os.getppid()}\n'
+
+
+def _fail(line):
+    raise ValueError(f'failed on {line.strip()}')
+
+
+@runOnUnixOnly
+class TestPipelineStages(TestCase):
+
+    def test_parallel_stage_should_keep_order_of_lines(self):
+        numbers = ''.join(f'{i}\n' for i in range(1000))
+        res = PIPE.text(numbers) | parallel_stage(_square_odd, workers=4, chunk_lines=7) | PIPE_END_STDOUT
+        self.assertEqual(''.join(f'{i * i}\n' for i in range(1, 1000, 2)), res)
+
+    def test_parallel_stage_workers_should_not_be_forked_from_pipeline_process(self):
+        res = PIPE.text('1\n') | parallel_stage(_worker_parent_pid, workers=1) | PIPE_END_STDOUT
+        self.assertNotEqual(str(os.getpid()), res.strip())
+
+    def test_parallel_stage_unordered_should_emit_all_lines(self):
+        numbers = ''.join(f'{i}\n' for i in range(1000))
+        res = (
+            PIPE.text(numbers)
+            | 'cat'
+            | parallel_stage(_square_odd, workers=3, chunk_lines=10, ordered=False)
+            | 'sort -n'
+            | PIPE_END_STDOUT
+        )
+        self.assertEqual(''.join(f'{i * i}\n' for i in range(1, 1000, 2)), res)
+
+    def test_parallel_stage_should_run_in_worker_processes(self):
+        res = PIPE.text('a\nb\n') | parallel_stage(_worker_pid, workers=1, chunk_lines=1) | PIPE_END_STDOUT
+        self.assertNotIn(str(os.getpid()), res.split())
+
+    def test_parallel_stage_should_report_worker_exception(self):
+        res = (PIPE.text('a\n') | parallel_stage(_fail, workers=1)).close()
+        self.assertIsInstance(res.exception, ValueError)
+        self.assertEqual('', res.stdout)
+
+    def test_parallel_stage_should_reject_invalid_chunk_size(self):
+        with self.assertRaises(IllegalArgumentException):
+            parallel_stage(_square_odd, chunk_lines=0)
+
+    def test_head_should_stop_endless_command(self):
+        res = PIPE | 'yes' | head(3) | PIPE_END_STDOUT
+        self.assertEqual('y\ny\ny\n', res)
+
+    def test_head_should_stop_upstream_python_stage(self):
+        produced = []
+
+        def _endless(stream_input, stream_output):
+            i = 0
+            while True:
+                produced.append(i)
+                stream_output.write(f'{i}\n')
+                i += 1
+
+        p = PIPE | _endless | 'cat' | head(2)
+        self.assertEqual('0\n1\n', p.close().stdout)
+        self.assertIsInstance(p._items[0].result.exception, BrokenPipeError)
+
+    def test_take_while_should_stop_on_first_not_matching_line(self):
+        res = PIPE | 'seq 1 1000000000' | take_while(lambda line: int(line) < 4) | PIPE_END_STDOUT
+        self.assertEqual('1\n2\n3\n', res)
+
+    def test_command_should_stop_endless_command(self):
+        res = PIPE | 'yes' | 'cat' | 'head -n 2' | PIPE_END_STDOUT
+        self.assertEqual('y\ny\n', res)
+
+    def test_tee_should_feed_branches_in_single_pass(self):
+        produced = []
+
+        def _numbers(lines):
+            for i in range(1, 2001):
+                produced.append(i)
+                yield f'{i}\n'
+
+        def _sum(lines):
+            yield f'{sum(int(line) for line in lines)}\n'
+
+        res = PIPE | _numbers | tee(['wc', '-l'], (_sum, 'cat'), queue_size=10) | head(3) | PIPE_END
+
+        self.assertEqual('1\n2\n3\n', res.stdout)
+        self.assertEqual(list(range(1, 2001)), produced)
+        self.assertEqual(['2000', '2001000'], [r.stdout.strip() for r in res.stages[1].result])
+
+    def test_tee_should_stop_feeding_branch_which_stopped_reading(self):
+        res = PIPE | ['seq', '1', '100000'] | tee(head(1), ['wc', '-l']) | 'tail -n 1' | PIPE_END
+        self.assertEqual('100000\n', res.stdout)
+        branches = res.stages[1].result
+        self.assertEqual(['1\n', '100000'], [branches[0].stdout, branches[1].stdout.strip()])
+
+    def test_tee_should_keep_results_of_each_run(self):
+        t = tee(['wc', '-l'])
+        template = PIPE.template(t)
+
+        first = template.run('a\n')
+        second = PIPE.text('a\nb\n') | t | PIPE_END
+
+        self.assertEqual('1', first.stages[1].result[0].stdout.strip())
+        self.assertEqual('2', second.stages[1].result[0].stdout.strip())
+
+    def test_merge_should_interleave_sources(self):
+        m = merge(['seq', '1', '3'], ('seq 4 6', lambda lines: (f'>{line}' for line in lines)), queue_size=2)
+        res = PIPE | m | 'sort' | PIPE_END
+        self.assertEqual(['1', '2', '3', '>4', '>5', '>6'], res.stdout.split())
+        self.assertEqual([0, 0], [r.stages[0].return_code for r in res.stages[0].result])
+
+    def test_merge_should_stop_sources_when_consumer_stops(self):
+        res = PIPE | merge('yes a', 'yes b') | head(5) | PIPE_END
+        self.assertEqual(5, len(res.stdout.split()))
+        self.assertTrue(all(r is not None for r in res.stages[0].result))
+
+    def test_merge_should_be_first_stage(self):
+        with self.assertRaises(IllegalStateException):
+            PIPE.text('a') | merge(['cat'])
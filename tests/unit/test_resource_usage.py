@@ -0,0 +1,66 @@
+import time
+from unittest import TestCase
+
+from common.platform_utils import runOnUnixOnly
+# noinspection PyProtectedMember
+from pyshrimp._internal.utils.process_spawning import _popen
+from pyshrimp.execution_pipeline.pipeline_starter import PIPE, PIPE_END
+from pyshrimp.utils.command import cmd, shell_cmd
+from pyshrimp.utils.resource_usage import ResourceUsageCollector, add_execution_listener, remove_execution_listener
+from pyshrimp.utils.subprocess_utils import run_process
+
+
+@runOnUnixOnly
+class TestResourceUsage(TestCase):
+
+    def test_run_process_should_collect_resource_usage(self):
+        res = run_process(['bash', '-c', 'i=0; while ((i < 200000)); do ((i++)); done; sleep 0.1'])
+        usage = res.resource_usage
+
+        self.assertGreaterEqual(usage.wall_time_sec, 0.1)
+        self.assertGreater(usage.user_cpu_sec + usage.system_cpu_sec, 0)
+        self.assertGreater(usage.max_rss_bytes, 1024 * 1024)
+        self.assertGreater(usage.voluntary_context_switches + usage.involuntary_context_switches, 0)
+
+    def test_process_reaped_by_poll_should_keep_resource_usage(self):
+        process = _popen(['true'])
+        while process.poll() is None:
+            time.sleep(0.01)
+        time.sleep(0.5)
+
+        usage = process.resource_usage_fields()
+        self.assertLess(usage['wall_time_sec'], 0.5)
+        self.assertIsNotNone(usage['user_cpu_sec'])
+        self.assertIsNotNone(usage['max_rss_bytes'])
+
+    def test_failing_listener_should_not_change_result(self):
+        def _failing_listener(result):
+            raise ValueError('listener failure')
+
+        add_execution_listener(_failing_listener)
+        try:
+            with self.assertLogs(level='ERROR'):
+                res = run_process(['echo', 'hi'])
+        finally:
+            remove_execution_listener(_failing_listener)
+
+        self.assertEqual(0, res.return_code)
+        self.assertEqual('hi\n', res.standard_output)
+
+    def test_collector_should_aggregate_executions(self):
+        with ResourceUsageCollector() as collector:
+            for _ in range(3):
+                cmd('true').exec()
+
+            shell_cmd('sleep 0.2').exec()
+            PIPE.text('abc') | cmd('cat') | PIPE_END
+
+        cmd('true').exec()
+
+        summaries = {s.key: s for s in collector.summaries()}
+        self.assertEqual(3, summaries['true'].executions)
+        self.assertEqual({0: 3}, summaries['true'].return_codes)
+        self.assertEqual(1, summaries['cat'].executions)
+        self.assertIsNotNone(summaries['cat'].max_rss_bytes)
+        self.assertEqual('/bin/bash -c sleep 0.2 bash', collector.summaries()[0].key)
+        self.assertIn('/bin/bash -c sleep 0.2 bash', collector.report())
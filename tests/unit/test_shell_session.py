@@ -0,0 +1,75 @@
+import time
+from unittest import TestCase
+
+from common.platform_utils import runOnUnixOnly
+from pyshrimp.utils.resource_usage import add_execution_listener, remove_execution_listener
+from pyshrimp.utils.shell_session import shell_session
+from pyshrimp.utils.subprocess_utils import ProcessExecutionException
+
+
+@runOnUnixOnly
+class TestShellSession(TestCase):
+
+    def test_session_should_separate_outputs_and_exit_code(self):
+        with shell_session(check=False) as sh:
+            res = sh.run('echo -n out; echo -n err >&2; exit_code=3; (exit $exit_code)')
+            self.assertEqual('out', res.standard_output)
+            self.assertEqual('err', res.error_output)
+            self.assertEqual(3, res.return_code)
+
+            res = sh.run('printf "a\\nb\\n\\n"')
+            self.assertEqual('a\nb\n\n', res.standard_output)
+            self.assertEqual('', res.error_output)
+            self.assertEqual(0, res.return_code)
+
+    def test_session_should_keep_state_between_calls_until_reset(self):
+        with shell_session() as sh:
+            sh.run('export SESSION_VAR=value; cd /')
+            self.assertEqual('value:/', sh.run('echo -n "$SESSION_VAR:$(pwd)"').standard_output)
+
+            sh.reset()
+            self.assertEqual(':', sh.run('echo -n "$SESSION_VAR:"').standard_output)
+
+        with shell_session(reset_each_call=True) as sh:
+            sh.run('SESSION_VAR=value')
+            self.assertEqual('', sh.run('echo -n "$SESSION_VAR"').standard_output)
+
+    def test_session_should_pass_arguments_and_raise_on_error(self):
+        with shell_session() as sh:
+            self.assertEqual("a b|'c'", sh.run('echo -n "$1|$2"', 'a b', "'c'").standard_output)
+            with self.assertRaises(ProcessExecutionException):
+                sh.run('false')
+
+    def test_session_should_recover_after_shell_exit(self):
+        with shell_session(check=False) as sh:
+            res = sh.run('echo -n bye; exit 7')
+            self.assertEqual('bye', res.standard_output)
+            self.assertEqual(7, res.return_code)
+            self.assertEqual('hello', sh.run('echo -n hello').standard_output)
+
+    def test_session_should_decode_output_as_other_commands(self):
+        with shell_session() as sh:
+            res = sh.run("printf 'a\\r\\nb\\r\\n'")
+            self.assertEqual('a\nb\n', res.standard_output)
+
+    def test_session_should_notify_execution_listeners(self):
+        executed = []
+        add_execution_listener(executed.append)
+        try:
+            with shell_session() as sh:
+                sh.run('echo -n a')
+                sh.run('echo -n b')
+        finally:
+            remove_execution_listener(executed.append)
+
+        self.assertEqual(['echo -n a', 'echo -n b'], [res.command for res in executed])
+        self.assertTrue(all(res.resource_usage.wall_time_sec > 0 for res in executed))
+
+    def test_session_should_be_faster_than_new_shell_per_call(self):
+        with shell_session() as sh:
+            sh.run('true')
+            started_at = time.time()
+            for i in range(100):
+                self.assertEqual(str(i), sh.run(f'echo -n {i}').standard_output)
+
+            self.assertLess(time.time() - started_at, 5)
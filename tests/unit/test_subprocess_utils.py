@@ -1,8 +1,16 @@
+import os
+import shutil
+import signal
+import subprocess
 from unittest import TestCase
 
 from common.platform_utils import runOnUnixOnly
 from common.resources_accessor import get_test_resource_file_as_text
-from pyshrimp.utils.subprocess_utils import run_process, ProcessExecutionException
+# noinspection PyProtectedMember
+from pyshrimp._internal.utils.process_spawning import _fast_spawn_executable
+# noinspection PyProtectedMember
+from pyshrimp._internal.utils.subprocess_utils import _spawn_process
+from pyshrimp.utils.subprocess_utils import run_process, stream_process, ProcessExecutionException
 
 
 @runOnUnixOnly
@@ -32,3 +40,28 @@ class TestSubprocessUtils(TestCase):
             '  Error: \'\'',
             str(exception)
         )
+
+    def test_stream_process_should_not_deadlock_on_large_error_output(self):
+        stream = stream_process(['bash', '-c', 'head -c 1000000 /dev/zero >&2; echo done'])
+        self.assertEqual(['done\n'], list(stream))
+        self.assertEqual(1000000, len(stream.result.error_output))
+
+    def test_run_process_with_fast_spawn_should_return_output(self):
+        res = run_process(['echo', '-n', 'hello'], fast_spawn=True, env={'PATH': os.environ.get('PATH', os.defpath)})
+        self.assertEqual('hello', res.raise_if_not_ok().standard_output)
+
+    def test_fast_spawn_should_resolve_executable_only_when_child_setup_is_trivial(self):
+        env = {'PATH': os.environ.get('PATH', os.defpath)}
+        self.assertEqual(shutil.which('echo'), _fast_spawn_executable(['echo', 'x'], shell=False, cwd=None, env=env))
+        self.assertEqual('./x.sh', _fast_spawn_executable(['./x.sh'], shell=False, cwd=None, env=env))
+        self.assertIsNone(_fast_spawn_executable(['echo', 'x'], shell=False, cwd='/', env=env))
+        self.assertIsNone(_fast_spawn_executable('echo x', shell=True, cwd=None, env=env))
+        self.assertIsNone(_fast_spawn_executable(['no-such-executable-0xf00'], shell=False, cwd=None, env=env))
+
+    def test_executing_process_close_with_timeout_should_kill_process_group(self):
+        process = _spawn_process(['bash', '-c', 'sleep 30 | cat; echo never'], capture_output=True, process_group=True)
+        res = process.close(timeout=0.2)
+
+        self.assertEqual(-signal.SIGKILL, res.return_code)
+        self.assertIsInstance(res.exception, subprocess.TimeoutExpired)
+        self.assertEqual('', res.standard_output)